@@ -1,7 +1,8 @@
 from flask import Flask
 from flask_cors import CORS
 from .config import Config
-from .extensions import db, login_manager, limiter
+from .extensions import db, login_manager, limiter, scheduler, feed_cache, reaction_buffer, notification_queue, notification_broker, user_versions, user_cache, user_cards, media_processor, storage
+from .services.blobs import UploadRequest
 from sqlalchemy import event
 from sqlalchemy.engine import Engine
 from sqlite3 import Connection as SQLite3Connection
@@ -18,10 +19,21 @@ def set_sqlite_pragma(dbapi_conn, connection_record):
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.request_class = UploadRequest  # uploads are hashed while they stream in
 
     db.init_app(app)
+    storage.init_app(app)
     login_manager.init_app(app)
     limiter.init_app(app)
+    scheduler.init_app(app)
+    feed_cache.init_app(app)
+    user_versions.init_app(app)
+    user_cache.init_app(app)
+    user_cards.init_app(app)
+    reaction_buffer.init_app(app)
+    notification_queue.init_app(app)
+    notification_broker.init_app(app)
+    media_processor.init_app(app)
 
     # CORS configuration for frontend on localhost:3000
     CORS(
@@ -38,6 +50,7 @@ def create_app():
     from .routes.media import media_bp
     from .routes.users import users_bp
     from .routes.notifications import notifications_bp
+    from .routes.uploads import uploads_bp
 
     app.register_blueprint(auth_bp, url_prefix="/auth")
     app.register_blueprint(posts_bp, url_prefix="/posts")
@@ -46,23 +59,28 @@ def create_app():
     app.register_blueprint(media_bp, url_prefix="/media")
     app.register_blueprint(users_bp, url_prefix="/users")
     app.register_blueprint(notifications_bp, url_prefix="/notifications")
+    app.register_blueprint(uploads_bp, url_prefix="/uploads")
 
-    @app.get("/healthz")
-    def healthz():
-        return {"status": "ok"}
+    from .cli import register_commands
+    register_commands(app)
 
-    # serve uploaded files (dev only)
-    from flask import send_from_directory
-    import os
+    from .services.ranking import redecay_hot_scores
+    scheduler.add_job("hot-decay", "HOT_DECAY_INTERVAL_SECONDS", redecay_hot_scores)
+    from .services.retention import prune_notifications
+    scheduler.add_job("notification-retention", "NOTIFY_RETENTION_INTERVAL_SECONDS", prune_notifications)
+    scheduler.add_job("media-sweep", "MEDIA_SWEEP_INTERVAL_SECONDS", media_processor.sweep)
 
-    @app.get("/uploads/<path:filename>")
-    def uploaded_file(filename):
-        upload_folder = app.config["UPLOAD_FOLDER"]
-        full_path = os.path.join(upload_folder, filename)
-        app.logger.info(f"Serving file: {filename}")
-        app.logger.info(f"Upload folder: {upload_folder}")
-        app.logger.info(f"Full path: {full_path}")
-        app.logger.info(f"File exists: {os.path.exists(full_path)}")
-        return send_from_directory(upload_folder, filename)
+    @app.get("/healthz")
+    def healthz():
+        return {
+            "status": "ok",
+            "feed_cache": feed_cache.stats(),
+            "user_cache": user_cache.stats(),
+            "user_cards": user_cards.stats(),
+            "reaction_buffer": reaction_buffer.stats(),
+            "notification_queue": notification_queue.stats(),
+            "stream_connections": notification_broker.connections(),
+            "media_processor": media_processor.stats(),
+        }
 
     return app
@@ -0,0 +1,103 @@
+import click
+
+
+def register_commands(app):
+    @app.cli.command("upgrade-schema")
+    @click.option("--batch-size", default=1000, show_default=True, help="Rows per transaction when backfilling")
+    def upgrade_schema_command(batch_size):
+        """Add missing tables, columns and indexes, then backfill derived columns."""
+        from .services.schema import upgrade_schema
+
+        result = upgrade_schema(batch_size=batch_size)
+        click.echo(
+            f"Created {len(result['tables'])} tables, {len(result['columns'])} columns "
+            f"and {len(result['indexes'])} indexes"
+        )
+        for name in result["tables"] + result["columns"] + result["indexes"]:
+            click.echo(f"  + {name}")
+        counters = result["counters"]
+        click.echo(
+            f"Removed {result['duplicate_reactions']} duplicate reactions; repaired counters on "
+            f"{counters['posts']} posts and {counters['comments']} comments, rescored {result['hot_scores']} posts, rewrote {result['comment_paths']} comment paths"
+        )
+
+    @app.cli.command("reconcile-counters")
+    @click.option("--batch-size", default=1000, show_default=True, help="Rows per transaction")
+    def reconcile_counters_command(batch_size):
+        """Recompute denormalized reaction and comment counters."""
+        from .services.counters import reconcile_counters
+
+        result = reconcile_counters(batch_size=batch_size)
+        click.echo(f"Repaired counters on {result['posts']} posts and {result['comments']} comments")
+
+    @app.cli.command("rebuild-search-index")
+    def rebuild_search_index_command():
+        """Create and rebuild the full-text index over posts."""
+        from .services.search import rebuild_search_index
+
+        dialect = rebuild_search_index()
+        if dialect is None:
+            click.echo("No full-text backend for this database; search uses ILIKE")
+        else:
+            click.echo(f"Rebuilt {dialect} full-text index")
+
+    @app.cli.command("redecay-hot-scores")
+    def redecay_hot_scores_command():
+        """Re-apply time decay to hot feed scores now."""
+        from .services.ranking import redecay_hot_scores
+
+        click.echo(f"Rescored {redecay_hot_scores()} posts")
+
+    @app.cli.command("migrate-comment-paths")
+    @click.option("--batch-size", default=1000, show_default=True, help="Rows per transaction")
+    def migrate_comment_paths_command(batch_size):
+        """Rewrite comment paths into the fixed-width sortable encoding."""
+        from .services.comment_tree import migrate_comment_paths
+
+        click.echo(f"Rewrote {migrate_comment_paths(batch_size=batch_size)} comment paths")
+
+    @app.cli.command("notification-worker")
+    @click.option("--drain", is_flag=True, help="Deliver what is queued now and exit")
+    def notification_worker_command(drain):
+        """Deliver queued notifications from this process."""
+        from .extensions import notification_queue
+
+        if drain:
+            click.echo(f"Delivered {notification_queue.drain()} notifications")
+            return
+        click.echo("Delivering notifications, Ctrl+C to stop")
+        try:
+            notification_queue.run_worker()
+        except KeyboardInterrupt:
+            notification_queue.stop()
+
+    @app.cli.command("prune-notifications")
+    @click.option("--batch-size", default=500, show_default=True, help="Rows per transaction")
+    def prune_notifications_command(batch_size):
+        """Delete notifications past the retention policies."""
+        from .services.retention import prune_notifications
+
+        result = prune_notifications(batch_size=batch_size)
+        click.echo(
+            f"Removed {result['read_expired']} expired read, {result['expired']} expired "
+            f"and {result['over_cap']} over-cap notifications in {result['seconds']}s"
+        )
+
+    @app.cli.command("process-images")
+    @click.option("--workers", type=int, default=None, help="Worker processes [default: one per core]")
+    @click.option("--batch-size", default=100, show_default=True, help="Media rows per batch")
+    def process_images_command(workers, batch_size):
+        """Create derivatives and placeholder metadata for images missing them."""
+        from .extensions import media_processor
+
+        click.echo(f"Processed {media_processor.backfill(workers=workers, batch_size=batch_size)} media rows")
+
+    @app.cli.command("migrate-upload-layout")
+    @click.option("--workers", default=8, show_default=True, help="Threads moving files")
+    @click.option("--batch-size", default=500, show_default=True, help="Media rows per transaction")
+    def migrate_upload_layout_command(workers, batch_size):
+        """Move flat uploads into UPLOAD_LAYOUT and rewrite their URLs (resumable)."""
+        from .services.upload_migration import migrate_upload_layout
+
+        result = migrate_upload_layout(workers=workers, batch_size=batch_size)
+        click.echo(f"Moved {result['files']} files; rewrote {result['media']} media rows and {result['blobs']} blobs")
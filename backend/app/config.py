@@ -9,4 +9,109 @@ class Config:
     # Use absolute path relative to the backend directory
     BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
     UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", os.path.join(BASE_DIR, "uploads"))
+    # "sharded" (ab/cd/<name>) or "flat"; see services/storage.py and `flask migrate-upload-layout`
+    UPLOAD_LAYOUT = os.getenv("UPLOAD_LAYOUT", "sharded")
     MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", str(10 * 1024 * 1024)))  # 10MB
+
+    # Feed pagination
+    FEED_TOTAL_CACHE_SECONDS = int(os.getenv("FEED_TOTAL_CACHE_SECONDS", "30"))
+
+    # "Hot" feed ranking: (base + w_r * reactions + w_c * comments) / (age_hours + 2) ** gravity
+    HOT_GRAVITY = float(os.getenv("HOT_GRAVITY", "1.8"))
+    HOT_BASE_SCORE = float(os.getenv("HOT_BASE_SCORE", "1.0"))
+    HOT_REACTION_WEIGHT = float(os.getenv("HOT_REACTION_WEIGHT", "1.0"))
+    HOT_COMMENT_WEIGHT = float(os.getenv("HOT_COMMENT_WEIGHT", "2.0"))
+    HOT_WINDOW_DAYS = int(os.getenv("HOT_WINDOW_DAYS", "7"))  # older posts drop to a score of 0
+    HOT_DECAY_INTERVAL_SECONDS = int(os.getenv("HOT_DECAY_INTERVAL_SECONDS", "300"))
+
+    # Background housekeeping jobs (services/scheduler.py), run by whichever
+    # web worker holds the scheduler lease
+    SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+    SCHEDULER_LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", "60"))
+
+    # Anonymous feed response cache: "memory" (per worker), "sqlite" (shared
+    # by all workers on the host through FEED_CACHE_PATH) or "none"
+    FEED_CACHE_BACKEND = os.getenv("FEED_CACHE_BACKEND", "memory")
+    FEED_CACHE_TTL = int(os.getenv("FEED_CACHE_TTL", "30"))
+    FEED_CACHE_MAX_ENTRIES = int(os.getenv("FEED_CACHE_MAX_ENTRIES", "1024"))
+    FEED_CACHE_PATH = os.getenv("FEED_CACHE_PATH", os.path.join(BASE_DIR, "feed_cache.db"))
+
+    # Post search: "auto" uses SQLite FTS5 / MySQL FULLTEXT, "like" forces ILIKE scans
+    SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+
+    # Comment threads: top-level page size and reply levels loaded per request
+    COMMENTS_PAGE_SIZE = int(os.getenv("COMMENTS_PAGE_SIZE", "20"))
+    COMMENTS_MAX_DEPTH = int(os.getenv("COMMENTS_MAX_DEPTH", "3"))
+    COMMENTS_MAX_DEPTH_LIMIT = int(os.getenv("COMMENTS_MAX_DEPTH_LIMIT", "10"))
+    COMMENTS_MAX_NESTING = int(os.getenv("COMMENTS_MAX_NESTING", "100"))
+
+    # Upper bound on post_ids + comment_ids in one POST /reactions/summary
+    REACTION_SUMMARY_MAX_IDS = int(os.getenv("REACTION_SUMMARY_MAX_IDS", "300"))
+
+    # Write-behind reactions: acknowledge with 202 and apply coalesced toggles
+    # in batches every REACTION_FLUSH_INTERVAL_MS or REACTION_FLUSH_MAX_OPS ops;
+    # pending toggles sit in a local SQLite file shared by every worker
+    REACTION_WRITE_BEHIND = os.getenv("REACTION_WRITE_BEHIND", "0") == "1"
+    REACTION_FLUSH_INTERVAL_MS = int(os.getenv("REACTION_FLUSH_INTERVAL_MS", "200"))
+    REACTION_FLUSH_MAX_OPS = int(os.getenv("REACTION_FLUSH_MAX_OPS", "500"))
+    REACTION_BUFFER_PATH = os.getenv("REACTION_BUFFER_PATH", os.path.join(BASE_DIR, "reaction_buffer.db"))
+
+    # Notification delivery queue (services/notification_queue.py): a local
+    # SQLite file drained by NOTIFY_WORKERS threads per process; set workers
+    # to 0 to deliver from `flask notification-worker` instead
+    NOTIFY_QUEUE_PATH = os.getenv("NOTIFY_QUEUE_PATH", os.path.join(BASE_DIR, "notify_queue.db"))
+    NOTIFY_WORKERS = int(os.getenv("NOTIFY_WORKERS", "2"))
+    NOTIFY_BATCH_SIZE = int(os.getenv("NOTIFY_BATCH_SIZE", "200"))
+    NOTIFY_POLL_INTERVAL_MS = int(os.getenv("NOTIFY_POLL_INTERVAL_MS", "250"))
+    NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "8"))
+    NOTIFY_LEASE_SECONDS = int(os.getenv("NOTIFY_LEASE_SECONDS", "60"))
+
+    # Reaction notifications on one target fold into a single row while it
+    # keeps getting activity within this window (0 disables coalescing)
+    NOTIFY_COALESCE_WINDOW_HOURS = int(os.getenv("NOTIFY_COALESCE_WINDOW_HOURS", "24"))
+    NOTIFY_RECENT_ACTORS = int(os.getenv("NOTIFY_RECENT_ACTORS", "3"))
+
+    # Live notification stream (GET /notifications/stream)
+    SSE_POLL_INTERVAL_MS = int(os.getenv("SSE_POLL_INTERVAL_MS", "1000"))
+    SSE_POLL_OVERLAP_SECONDS = int(os.getenv("SSE_POLL_OVERLAP_SECONDS", "5"))
+    SSE_HEARTBEAT_SECONDS = int(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+    SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "100"))
+    SSE_RESUME_LIMIT = int(os.getenv("SSE_RESUME_LIMIT", "100"))
+
+    # Notification inbox page size (GET /notifications)
+    NOTIFICATIONS_PAGE_SIZE = int(os.getenv("NOTIFICATIONS_PAGE_SIZE", "50"))
+
+    # Notification retention (services/retention.py); 0 disables a policy
+    NOTIFY_RETENTION_READ_DAYS = int(os.getenv("NOTIFY_RETENTION_READ_DAYS", "30"))
+    NOTIFY_RETENTION_MAX_AGE_DAYS = int(os.getenv("NOTIFY_RETENTION_MAX_AGE_DAYS", "180"))
+    NOTIFY_RETENTION_MAX_PER_USER = int(os.getenv("NOTIFY_RETENTION_MAX_PER_USER", "1000"))
+    NOTIFY_RETENTION_PAUSE_MS = int(os.getenv("NOTIFY_RETENTION_PAUSE_MS", "50"))
+    NOTIFY_RETENTION_INTERVAL_SECONDS = int(os.getenv("NOTIFY_RETENTION_INTERVAL_SECONDS", "3600"))
+
+    # Per-user change counters that tell every worker's user caches an entry
+    # is stale; a local SQLite file shared by all workers on the host
+    USER_VERSIONS_PATH = os.getenv("USER_VERSIONS_PATH", os.path.join(BASE_DIR, "user_versions.db"))
+
+    # Logged-in user cache behind the Flask-Login loader (0 disables it)
+    USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300"))
+    USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+    # Author cards ({id, name, profile_pic, verified}) used by list endpoints
+    USER_CARD_TTL = int(os.getenv("USER_CARD_TTL", "600"))
+    USER_CARD_MAX_ENTRIES = int(os.getenv("USER_CARD_MAX_ENTRIES", "20000"))
+
+    # Resized WebP copies and placeholder metadata of uploaded images, made by
+    # MEDIA_WORKERS processes in the scheduler's leader worker, which also picks
+    # up uploads handled by other workers every MEDIA_SWEEP_INTERVAL_SECONDS;
+    # 0 (or no scheduler) leaves them to `flask process-images`
+    MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", "2"))
+    MEDIA_SWEEP_INTERVAL_SECONDS = int(os.getenv("MEDIA_SWEEP_INTERVAL_SECONDS", "10"))
+    MEDIA_DERIVATIVE_WIDTHS = [int(w) for w in os.getenv("MEDIA_DERIVATIVE_WIDTHS", "320,640,1280").split(",")]
+    MEDIA_WEBP_QUALITY = int(os.getenv("MEDIA_WEBP_QUALITY", "80"))
+
+    # /uploads serving (routes/uploads.py): "flask" sends files from the
+    # worker; "x-accel" (nginx, internal location UPLOADS_ACCEL_PREFIX) and
+    # "x-sendfile" hand the bytes to the fronting server
+    UPLOADS_SERVE_MODE = os.getenv("UPLOADS_SERVE_MODE", "flask")
+    UPLOADS_ACCEL_PREFIX = os.getenv("UPLOADS_ACCEL_PREFIX", "/protected-uploads/")
+    UPLOADS_CACHE_MAX_AGE = int(os.getenv("UPLOADS_CACHE_MAX_AGE", str(365 * 24 * 3600)))
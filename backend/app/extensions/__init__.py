@@ -2,8 +2,28 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from ..services.cache import ResponseCache
+from ..services.media_processor import MediaProcessor
+from ..services.notification_queue import NotificationQueue
+from ..services.notification_stream import NotificationBroker
+from ..services.reaction_buffer import ReactionBuffer
+from ..services.scheduler import Scheduler
+from ..services.storage import LocalStorage
+from ..services.user_cache import UserCache
+from ..services.user_cards import UserCards
+from ..services.user_versions import UserVersions
 
 
 db = SQLAlchemy()
 login_manager = LoginManager()
 limiter = Limiter(key_func=get_remote_address)
+scheduler = Scheduler()
+feed_cache = ResponseCache()
+reaction_buffer = ReactionBuffer()
+notification_queue = NotificationQueue()
+notification_broker = NotificationBroker()
+user_versions = UserVersions()
+user_cache = UserCache()
+user_cards = UserCards()
+media_processor = MediaProcessor()
+storage = LocalStorage()
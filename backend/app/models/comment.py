@@ -1,7 +1,8 @@
 from datetime import datetime
 from ..extensions import db
+from .reaction import ReactionCounters
 
-class Comment(db.Model):
+class Comment(ReactionCounters, db.Model):
     __tablename__ = "comments"
     id = db.Column(db.Integer, primary_key=True)
     post_id = db.Column(db.Integer, db.ForeignKey("posts.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -9,11 +10,17 @@ class Comment(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
     content = db.Column(db.Text, nullable=False)
     depth = db.Column(db.Integer, default=0)
-    path = db.Column(db.String(1024), index=True)  # materialized path string
+    path = db.Column(db.String(1024), index=True)  # fixed-width materialized path, see services/comment_tree.py
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_deleted = db.Column(db.Boolean, default=False)
+    reply_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     # Relationships for nested comments
     replies = db.relationship("Comment", backref=db.backref("parent", remote_side=[id]), cascade="all, delete-orphan", passive_deletes=True)
     reactions = db.relationship("Reaction", backref="comment", cascade="all, delete-orphan", passive_deletes=True)
     user = db.relationship("User", backref="comments")
+
+    __table_args__ = (
+        db.Index("ix_comments_post_roots", "post_id", "parent_id", "is_deleted", "created_at", "id"),
+        db.Index("ix_comments_post_path", "post_id", "path"),
+    )
@@ -13,7 +13,43 @@ class Notification(db.Model):
     actor_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)  # Who triggered the notification
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    # Reaction notifications are coalesced per target (services/notifications.py):
+    # actor_id is the latest actor, recent_actor_ids the newest few, newest first,
+    # and actor_count the distinct actors recorded in notification_actors.
+    # coalesce_key is set while the row is the open aggregate for its target
+    actor_count = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    recent_actor_ids = db.Column(db.JSON)
+    coalesce_key = db.Column(db.String(120))
+    # Set whenever delivery inserts or updates the row; the live stream
+    # (services/notification_stream.py) follows this column
+    delivered_at = db.Column(db.DateTime, index=True)
+    
+    __table_args__ = (
+        # One open aggregate per (recipient, type, target), even across queue workers
+        db.Index("uniq_notifications_coalesce_key", "coalesce_key", unique=True),
+        # Inbox pages, all and unread-only, newest first
+        db.Index("ix_notifications_inbox", "user_id", "created_at", "id"),
+        db.Index("ix_notifications_inbox_unread", "user_id", "is_read", "created_at", "id"),
+    )
     
     # Relationships
     user = db.relationship("User", foreign_keys=[user_id], backref="notifications")
     actor = db.relationship("User", foreign_keys=[actor_id])
+
+class NotificationActor(db.Model):
+    """One row per distinct actor folded into a coalesced notification"""
+    __tablename__ = "notification_actors"
+
+    notification_id = db.Column(db.Integer, db.ForeignKey("notifications.id", ondelete="CASCADE"), primary_key=True)
+    actor_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+
+class UnreadCounter(db.Model):
+    """Per-user unread notification count, so polling is a primary-key read.
+
+    Kept in step by services/notifications.py; a missing or inconsistent
+    row is rebuilt from the notifications table on the next read.
+    """
+    __tablename__ = "notification_unread_counters"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    unread = db.Column(db.Integer, nullable=False, default=0, server_default="0")
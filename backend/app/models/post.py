@@ -1,7 +1,8 @@
 from datetime import datetime
 from ..extensions import db
+from .reaction import ReactionCounters
 
-class Post(db.Model):
+class Post(ReactionCounters, db.Model):
     __tablename__ = "posts"
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
@@ -12,12 +13,25 @@ class Post(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     edited_at = db.Column(db.DateTime)
     is_deleted = db.Column(db.Boolean, default=False)
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    last_comment_at = db.Column(db.DateTime)  # any comment added, edited or deleted; validates the comment tree
+    hot_score = db.Column(db.Float, nullable=False, default=0, server_default="0")  # see services/ranking.py
 
     # Relationships with cascade delete
     comments = db.relationship("Comment", backref="post", cascade="all, delete-orphan", passive_deletes=True)
     media = db.relationship("Media", backref="post", cascade="all, delete-orphan", passive_deletes=True)
     reactions = db.relationship("Reaction", backref="post", cascade="all, delete-orphan", passive_deletes=True)
 
+    # Keyset pagination indexes: each feed page is a single range scan
+    __table_args__ = (
+        db.Index("ix_posts_feed_newest", "is_deleted", "created_at", "id"),
+        db.Index("ix_posts_category_newest", "category", "is_deleted", "created_at", "id"),
+        db.Index("ix_posts_feed_popular", "is_deleted", "reaction_count", "created_at", "id"),
+        db.Index("ix_posts_category_popular", "category", "is_deleted", "reaction_count", "created_at", "id"),
+        db.Index("ix_posts_feed_hot", "is_deleted", "hot_score", "created_at", "id"),
+        db.Index("ix_posts_category_hot", "category", "is_deleted", "hot_score", "created_at", "id"),
+    )
+
 class Media(db.Model):
     __tablename__ = "media"
     id = db.Column(db.Integer, primary_key=True)
@@ -26,4 +40,21 @@ class Media(db.Model):
     url = db.Column(db.String(512))
     mime = db.Column(db.String(120))
     size_bytes = db.Column(db.Integer)
+    blob_sha256 = db.Column(db.String(64), db.ForeignKey("blobs.sha256"), index=True)  # None for pre-dedup uploads
+    derivatives = db.Column(db.JSON(none_as_null=True))  # resized WebP copies, see services/media_processor.py
+    width = db.Column(db.Integer)  # as displayed, after EXIF orientation
+    height = db.Column(db.Integer)
+    dominant_color = db.Column(db.String(7))  # #rrggbb
+    blurhash = db.Column(db.String(64))
+    # Set once processing has run, even on an unreadable file, so the sweep skips it
+    processed_at = db.Column(db.DateTime, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Blob(db.Model):
+    """One stored upload file, shared by every Media row with the same bytes"""
+    __tablename__ = "blobs"
+    sha256 = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(255), nullable=False)  # storage key, relative to UPLOAD_FOLDER
+    size_bytes = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
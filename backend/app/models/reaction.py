@@ -1,6 +1,8 @@
 from datetime import datetime
 from ..extensions import db
 
+REACTION_TYPES = ("like", "helpful", "funny", "insightful", "celebrate")
+
 class Reaction(db.Model):
     __tablename__ = "reactions"
     id = db.Column(db.Integer, primary_key=True)
@@ -12,3 +14,27 @@ class Reaction(db.Model):
     __table_args__ = (
         db.UniqueConstraint("post_id", "comment_id", "user_id", "type", name="uniq_reaction"),
     )
+
+class ReactionCounters:
+    """Denormalized reaction tallies shared by Post and Comment.
+
+    Maintained in the same transaction as the reaction write
+    (see services/counters.py); `flask reconcile-counters` repairs drift.
+    """
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    helpful_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    funny_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    insightful_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    celebrate_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    reaction_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # Bumped on every reaction change; feeds the reaction endpoints' ETags
+    reaction_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    @classmethod
+    def counter_column(cls, type_):
+        return getattr(cls, f"{type_}_count")
+
+    def reaction_counts(self):
+        """Non-zero counts keyed by reaction type"""
+        counts = {t: getattr(self, f"{t}_count") or 0 for t in REACTION_TYPES}
+        return {t: n for t, n in counts.items() if n}
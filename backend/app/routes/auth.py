@@ -1,7 +1,7 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
-from ..extensions import db, login_manager, limiter
+from ..extensions import db, login_manager, limiter, user_cache
 from ..models.user import User
 from ..config import Config
 
@@ -10,7 +10,7 @@ serializer = URLSafeTimedSerializer(secret_key=Config.SECRET_KEY)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.load(int(user_id))
 
 @auth_bp.post("/signup")
 @limiter.limit("5/hour")
@@ -1,48 +1,68 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
 from datetime import datetime
-from ..extensions import db, limiter
+from ..extensions import db, limiter, notification_queue
 from ..models.comment import Comment
 from ..models.post import Post
-from ..models.notification import Notification
+from ..services.comment_tree import comment_path, max_nesting, load_descendants, build_forest
+from ..services.conditional import Validators
+from ..services.counters import bump_comment, invalidate_ranking, touch_comment_tree
+from ..services.notifications import notification_event
+from ..services.pagination import encode_cursor, decode_cursor, keyset_filter, InvalidCursor
 
 comments_bp = Blueprint("comments", __name__)
 
+MAX_PAGE_SIZE = 100
+
+def _max_depth_arg():
+    """Reply levels to load below the requested comments"""
+    default = current_app.config["COMMENTS_MAX_DEPTH"]
+    return min(max(request.args.get("max_depth", default, type=int), 0), current_app.config["COMMENTS_MAX_DEPTH_LIMIT"])
+
 @comments_bp.get("/post/<int:post_id>")
 @limiter.limit("120/hour")
 def list_comments(post_id):
-    # Fetch all comments for the post
-    all_comments = Comment.query.filter_by(
-        post_id=post_id, 
-        is_deleted=False
-    ).order_by(Comment.created_at.asc()).all()
-    
-    def serialize(c: Comment):
-        return {
-            "id": c.id,
-            "post_id": c.post_id,
-            "parent_id": c.parent_id,
-            "user_id": c.user_id,
-            "user_name": c.user.name if c.user else "Unknown",
-            "content": c.content,
-            "depth": c.depth,
-            "created_at": c.created_at.isoformat(),
-        }
-    
-    # Build tree structure
-    comment_map = {c.id: serialize(c) for c in all_comments}
-    for c in comment_map.values():
-        c['replies'] = []
-    
-    root_comments = []
-    for c in all_comments:
-        serialized = comment_map[c.id]
-        if c.parent_id is None:
-            root_comments.append(serialized)
-        elif c.parent_id in comment_map:
-            comment_map[c.parent_id]['replies'].append(serialized)
-    
-    return jsonify({"comments": root_comments})
+    # The post's last_comment_at moves on every comment add/edit/delete, so
+    # an unchanged tree is answered with a 304 before any comment is loaded
+    last_comment_at = db.session.query(Post.last_comment_at).filter(Post.id == post_id).scalar()
+    validators = Validators("comments", post_id, last_comment_at, request.query_string, last_modified=last_comment_at)
+    not_modified = validators.not_modified()
+    if not_modified:
+        return not_modified
+
+    limit = min(max(request.args.get("limit", current_app.config["COMMENTS_PAGE_SIZE"], type=int), 1), MAX_PAGE_SIZE)
+    max_depth = _max_depth_arg()
+    cursor = request.args.get("cursor")
+
+    # One page of top-level comments, keyset-paginated on (created_at, id)
+    keys = [Comment.created_at, Comment.id]
+    q = Comment.query.filter_by(post_id=post_id, parent_id=None, is_deleted=False)\
+        .order_by(Comment.created_at.asc(), Comment.id.asc())
+    if cursor:
+        try:
+            q = q.filter(keyset_filter(keys, decode_cursor(cursor, [datetime, int]), descending=False))
+        except InvalidCursor:
+            return jsonify({"error": "Invalid cursor"}), 400
+    roots = q.limit(limit + 1).all()
+    next_cursor = encode_cursor(roots[limit - 1].created_at, roots[limit - 1].id) if len(roots) > limit else None
+    roots = roots[:limit]
+
+    # Their replies down to max_depth, by materialized path range
+    descendants = load_descendants(post_id, roots, max_depth)
+    root_comments = build_forest(roots, descendants, max_depth)
+
+    return validators.apply(jsonify({"comments": root_comments, "next_cursor": next_cursor}))
+
+@comments_bp.get("/<int:comment_id>/subtree")
+@limiter.limit("120/hour")
+def get_subtree(comment_id):
+    """One branch of a thread, e.g. to expand a "more replies" stub"""
+    comment = Comment.query.get_or_404(comment_id)
+    if comment.is_deleted:
+        return jsonify({"error": "Comment deleted"}), 404
+    max_depth = comment.depth + _max_depth_arg()
+    descendants = load_descendants(comment.post_id, [comment], max_depth)
+    return jsonify({"comment": build_forest([comment], descendants, max_depth)[0]})
 
 @comments_bp.post("/post/<int:post_id>")
 @login_required
@@ -53,51 +73,43 @@ def add_comment(post_id):
     parent_id = data.get("parent_id")
     if not content:
         return jsonify({"error": "Content required"}), 400
-    path = None
+    parent_path = None
     depth = 0
     if parent_id:
         parent = Comment.query.get_or_404(parent_id)
         if parent.post_id != post_id:
             return jsonify({"error": "Parent mismatch"}), 400
         depth = (parent.depth or 0) + 1
-        path = f"{parent.path}/{parent.id}" if parent.path else str(parent.id)
+        if depth > max_nesting(current_app.config):
+            return jsonify({"error": "Reply thread is nested too deeply"}), 400
+        parent_path = parent.path
+        recipient_id = parent.user_id
+    else:
+        recipient_id = db.session.query(Post.user_id).filter(Post.id == post_id).scalar()
     comment = Comment(
         post_id=post_id,
         parent_id=parent_id,
         user_id=current_user.id,
         content=content,
         depth=depth,
-        path=path,
     )
     db.session.add(comment)
+    # The path ends with the comment's own id, so it is set once the insert
+    # has assigned one; both land in the same transaction
+    db.session.flush()
+    comment.path = comment_path(parent_path, comment.id)
+    bump_comment(post_id, parent_id, 1)
     db.session.commit()
+    invalidate_ranking(post_id)
     
-    # Create notification for post author or parent comment author
-    post = db.session.get(Post, post_id)
+    # Notify the post author or parent comment author in the background
     if parent_id:
-        parent = db.session.get(Comment, parent_id)
-        if parent and parent.user_id != current_user.id:
-            notification = Notification(
-                user_id=parent.user_id,
-                type="comment_reply",
-                content=f"{current_user.name} replied to your comment",
-                post_id=post_id,
-                comment_id=comment.id,
-                actor_id=current_user.id,
-            )
-            db.session.add(notification)
-    elif post and post.user_id != current_user.id:
-        notification = Notification(
-            user_id=post.user_id,
-            type="comment_reply",
-            content=f"{current_user.name} commented on your post",
-            post_id=post_id,
-            comment_id=comment.id,
-            actor_id=current_user.id,
-        )
-        db.session.add(notification)
-    
-    db.session.commit()
+        message = f"{current_user.name} replied to your comment"
+    else:
+        message = f"{current_user.name} commented on your post"
+    notification_queue.enqueue(notification_event(
+        recipient_id, current_user.id, current_user.name, "comment_reply", message, post_id=post_id, comment_id=comment.id,
+    ))
     return jsonify({"id": comment.id}), 201
 
 @comments_bp.patch("/<int:comment_id>")
@@ -111,6 +123,7 @@ def edit_comment(comment_id):
     content = data.get("content")
     if content is not None:
         comment.content = content
+        touch_comment_tree(comment.post_id)
     db.session.commit()
     return jsonify({"message": "Comment updated"})
 
@@ -121,6 +134,10 @@ def delete_comment(comment_id):
     comment = Comment.query.get_or_404(comment_id)
     if comment.user_id != current_user.id:
         return jsonify({"error": "Not allowed"}), 403
+    if comment.is_deleted:
+        return jsonify({"message": "Comment deleted"})
     comment.is_deleted = True
+    bump_comment(comment.post_id, comment.parent_id, -1)
     db.session.commit()
+    invalidate_ranking(comment.post_id)
     return jsonify({"message": "Comment deleted"})
@@ -1,10 +1,9 @@
-import os
-from uuid import uuid4
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
-from ..extensions import db, limiter
+from ..extensions import db, limiter, feed_cache, media_processor
 from ..models.post import Media, Post
+from ..services import blobs
+from ..services.cache import post_tags
 
 ALLOWED_IMAGE_MIME = {"image/png", "image/jpeg", "image/webp"}
 ALLOWED_DOC_MIME = {"application/pdf"}
@@ -32,25 +31,15 @@ def upload_media():
     if mtype is None:
         return jsonify({"error": "Unsupported file type"}), 400
 
-    # Ensure upload folder exists
-    upload_folder = current_app.config.get("UPLOAD_FOLDER")
-    os.makedirs(upload_folder, exist_ok=True)
-
-    # Save with unique name
-    ext = os.path.splitext(secure_filename(file.filename))[1]
-    fname = f"{uuid4().hex}{ext}"
-    fpath = os.path.join(upload_folder, fname)
-    file.save(fpath)
-
-    size_bytes = os.path.getsize(fpath)
-    max_len = current_app.config.get("MAX_CONTENT_LENGTH", 10 * 1024 * 1024)
-    if size_bytes > max_len:
-        os.remove(fpath)
-        return jsonify({"error": "File too large"}), 400
-
-    rel_path = f"/uploads/{fname}"
-    media = Media(post_id=post.id, type=mtype, url=rel_path, mime=mime, size_bytes=size_bytes)
+    # The body was streamed into a hashed spool file while the form was parsed
+    upload = file.stream
+    blob = blobs.acquire(upload, mime)
+    rel_path = blobs.blob_url(blob)
+    media = Media(post_id=post.id, type=mtype, url=rel_path, mime=mime, size_bytes=upload.size, blob_sha256=blob.sha256)
     db.session.add(media)
     db.session.commit()
+    blobs.place(upload, blob)
+    feed_cache.invalidate(*post_tags(post.id))  # cover_url may change
+    media_processor.submit(media)
 
     return jsonify({"id": media.id, "url": rel_path, "type": mtype}), 201
@@ -1,8 +1,16 @@
-from flask import Blueprint, jsonify
+import queue
+from datetime import datetime
+from flask import Blueprint, Response, current_app, jsonify, request
 from flask_login import login_required, current_user
-from ..extensions import db, limiter
+from sqlalchemy import or_
+from ..extensions import db, limiter, notification_broker
 from ..models.notification import Notification
-from ..models.user import User
+from ..services.notification_stream import RECONNECT, event_id, format_event
+from ..services.pagination import encode_cursor, decode_cursor, keyset_filter, InvalidCursor
+from ..services.notifications import bump_unread, recount_unread, reset_unread, serialize_notifications, unread_count
+
+MAX_PAGE_SIZE = 100
+MAX_BULK_READ = 500
 
 notifications_bp = Blueprint("notifications", __name__)
 
@@ -10,28 +18,37 @@ notifications_bp = Blueprint("notifications", __name__)
 @login_required
 @limiter.limit("300/minute")
 def list_notifications():
-    """Get current user's notifications"""
-    notifications = Notification.query.filter_by(user_id=current_user.id)\
-        .order_by(Notification.created_at.desc())\
-        .limit(50)\
-        .all()
+    """Get current user's notifications, newest first (`cursor`, `limit`, `unread=1`)"""
+    limit = min(max(request.args.get("limit", current_app.config["NOTIFICATIONS_PAGE_SIZE"], type=int), 1), MAX_PAGE_SIZE)
+    unread_only = request.args.get("unread") in ("1", "true")
+    cursor = request.args.get("cursor")
+
+    # Keyset pagination on (created_at, id), served by ix_notifications_inbox
+    # or, for unread only, ix_notifications_inbox_unread
+    keys = [Notification.created_at, Notification.id]
+    q = Notification.query.filter(Notification.user_id == current_user.id)
+    if unread_only:
+        q = q.filter(Notification.is_read == False)
+    if cursor:
+        try:
+            q = q.filter(keyset_filter(keys, decode_cursor(cursor, [datetime, int])))
+        except InvalidCursor:
+            return jsonify({"error": "Invalid cursor"}), 400
+    notifications = q.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(notifications) > limit:
+        last = notifications[limit - 1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+        notifications = notifications[:limit]
     
-    items = []
-    for n in notifications:
-        actor = db.session.get(User, n.actor_id)
-        items.append({
-            "id": n.id,
-            "type": n.type,
-            "content": n.content,
-            "post_id": n.post_id,
-            "comment_id": n.comment_id,
-            "actor_name": actor.name if actor else "Unknown",
-            "actor_id": n.actor_id,
-            "is_read": n.is_read,
-            "created_at": n.created_at.isoformat(),
-        })
+    # When the whole inbox fits on this page its exact unread count is
+    # known for free; use it to catch a drifted counter
+    elif not cursor:
+        unread = sum(1 for n in notifications if not n.is_read)
+        if unread != unread_count(current_user.id):
+            notification_broker.publish_unread(current_user.id, recount_unread(current_user.id))
     
-    return jsonify({"notifications": items})
+    return jsonify({"notifications": serialize_notifications(notifications), "next_cursor": next_cursor})
 
 @notifications_bp.post("/<int:notification_id>/read")
 @login_required
@@ -45,11 +62,48 @@ def mark_as_read(notification_id):
     if notification.user_id != current_user.id:
         return jsonify({"error": "Unauthorized"}), 403
     
-    notification.is_read = True
+    # Only a notification that was still unread moves the counter
+    updated = Notification.query.filter_by(id=notification_id, is_read=False)\
+        .update({"is_read": True}, synchronize_session=False)
+    bump_unread({current_user.id: -updated})
     db.session.commit()
+    if updated:
+        notification_broker.publish_unread(current_user.id, unread_count(current_user.id))
     
     return jsonify({"success": True})
 
+@notifications_bp.post("/read")
+@login_required
+@limiter.limit("300/minute")
+def mark_many_as_read():
+    """Mark notifications as read: `ids`, or `up_to_id` for that one and everything older"""
+    data = request.json or {}
+    ids = data.get("ids")
+    up_to_id = data.get("up_to_id")
+    q = Notification.query.filter(Notification.user_id == current_user.id, Notification.is_read == False)
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            return jsonify({"error": "ids must be a list of integer ids"}), 400
+        if len(ids) > MAX_BULK_READ:
+            return jsonify({"error": f"At most {MAX_BULK_READ} ids per request"}), 400
+        q = q.filter(Notification.id.in_(ids))
+    elif up_to_id is not None:
+        marker = db.session.query(Notification.created_at, Notification.id)\
+            .filter(Notification.id == up_to_id, Notification.user_id == current_user.id).first()
+        if not marker:
+            return jsonify({"error": "Notification not found"}), 404
+        keys = [Notification.created_at, Notification.id]
+        q = q.filter(or_(Notification.id == marker.id, keyset_filter(keys, list(marker))))
+    else:
+        return jsonify({"error": "ids or up_to_id required"}), 400
+
+    updated = q.update({"is_read": True}, synchronize_session=False)
+    bump_unread({current_user.id: -updated})
+    db.session.commit()
+    unread = unread_count(current_user.id)
+    notification_broker.publish_unread(current_user.id, unread)
+    return jsonify({"success": True, "updated": updated, "unread": unread})
+
 @notifications_bp.post("/read-all")
 @login_required
 @limiter.limit("100/minute")
@@ -57,7 +111,9 @@ def mark_all_as_read():
     """Mark all notifications as read"""
     Notification.query.filter_by(user_id=current_user.id, is_read=False)\
         .update({"is_read": True})
+    reset_unread(current_user.id)
     db.session.commit()
+    notification_broker.publish_unread(current_user.id, 0)
     
     return jsonify({"success": True})
 
@@ -66,9 +122,58 @@ def mark_all_as_read():
 @limiter.limit("300/minute")
 def get_unread_count():
     """Get count of unread notifications"""
-    count = Notification.query.filter_by(
-        user_id=current_user.id,
-        is_read=False
-    ).count()
-    
-    return jsonify({"count": count})
+    return jsonify({"count": unread_count(current_user.id)})
+
+@notifications_bp.get("/stream")
+@login_required
+@limiter.limit("30/minute")
+def stream_notifications():
+    """Server-Sent Events: new notifications and unread-count changes.
+
+    Pass the last received event id as Last-Event-ID (browsers do this on
+    reconnect) to first receive what was delivered while disconnected.
+    """
+    user_id = current_user.id
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    missed = []
+    if last_event_id:
+        try:
+            values = decode_cursor(last_event_id, [datetime, int])
+        except InvalidCursor:
+            return jsonify({"error": "Invalid Last-Event-ID"}), 400
+        missed = Notification.query.filter(
+            Notification.user_id == user_id,
+            keyset_filter([Notification.delivered_at, Notification.id], values, descending=False),
+        ).order_by(Notification.delivered_at, Notification.id)\
+            .limit(current_app.config["SSE_RESUME_LIMIT"]).all()
+    backlog = [
+        format_event("notification", event_id(n), payload)
+        for n, payload in zip(missed, serialize_notifications(missed))
+    ]
+    backlog.append(format_event("unread", None, {"count": unread_count(user_id)}))
+    heartbeat = current_app.config["SSE_HEARTBEAT_SECONDS"]
+    # Subscribe before streaming so nothing delivered from here on is lost
+    subscription = notification_broker.subscribe(user_id)
+
+    def generate():
+        try:
+            yield f"retry: {heartbeat * 1000}\n\n"
+            yield from backlog
+            while True:
+                try:
+                    event = subscription.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                if event is RECONNECT:
+                    return
+                yield format_event(*event)
+        finally:
+            notification_broker.unsubscribe(user_id, subscription)
+
+    # The generator runs after the request context (and its DB session) is
+    # released, so an idle connection holds no database resources
+    response = Response(generate(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
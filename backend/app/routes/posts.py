@@ -1,33 +1,132 @@
-from flask import Blueprint, request, jsonify
+import time
+from collections import OrderedDict
+from flask import Blueprint, request, jsonify, current_app, abort
 from flask_login import login_required, current_user
 from datetime import datetime
 from sqlalchemy import func
-from ..extensions import db, limiter
+from ..extensions import db, limiter, feed_cache, user_cards
 from ..models.post import Post, Media
-from ..models.reaction import Reaction
-from ..models.user import User
+from ..services import blobs
+from ..services.cache import post_tags
+from ..services.conditional import Validators
+from ..services.media_processor import placeholder, srcset
+from ..services.ranking import hot_score
+from ..services.search import search_hits, search_snippets
+from ..services.pagination import encode_cursor, decode_cursor, keyset_filter, InvalidCursor
 from bleach import clean
 
 posts_bp = Blueprint("posts", __name__)
 
+MAX_PAGE_SIZE = 100
+_TOTAL_CACHE_SIZE = 256
+_total_cache = OrderedDict()
+
+FEED_COLUMNS = (Post.id, Post.title, Post.category, Post.user_id, Post.created_at, Post.edited_at, Post.reaction_count, Post.hot_score)
+
+def _covers(post_ids):
+    """First image of each post, keyed by post id"""
+    if not post_ids:
+        return {}
+    first_image = db.session.query(func.min(Media.id))\
+        .filter(Media.post_id.in_(post_ids), Media.type == "image")\
+        .group_by(Media.post_id)
+    rows = db.session.query(
+        Media.post_id, Media.url, Media.derivatives, Media.width, Media.height, Media.dominant_color, Media.blurhash,
+    ).filter(Media.id.in_(first_image))
+    return {row.post_id: row for row in rows}
+
+def _feed_total(q, category, search):
+    """Exact count of the filtered feed, memoised so page-mode clients don't
+    pay a full COUNT on every request.
+
+    Entries remember the feed cache versions of the list's tags and are
+    dropped as soon as a post joins or leaves it (or, when searching, any
+    post's text changes); FEED_TOTAL_CACHE_SECONDS bounds how stale they
+    get where those versions are not shared between workers.
+    """
+    key = (category, search)
+    # Read before counting: a write landing after it makes this entry stale
+    versions = feed_cache.versions(_feed_tags(category, search, "newest"))
+    ttl = current_app.config.get("FEED_TOTAL_CACHE_SECONDS", 30)
+    now = time.monotonic()
+    hit = _total_cache.get(key)
+    if hit and hit[0] > now and hit[1] == versions:
+        return hit[2]
+    total = q.count()
+    _total_cache[key] = (now + ttl, versions, total)
+    _total_cache.move_to_end(key)
+    while len(_total_cache) > _TOTAL_CACHE_SIZE:
+        _total_cache.popitem(last=False)
+    return total
+
 @posts_bp.get("")
 @limiter.limit("300/minute")
 def list_posts():
     category = request.args.get("category")
     search = request.args.get("search", "").strip()
-    sort = request.args.get("sort", "newest")  # newest, popular
-    page = int(request.args.get("page", 1))
-    limit = int(request.args.get("limit", 20))
-    offset = (page - 1) * limit
+    # newest, popular, hot, relevance (default when searching)
+    sort = request.args.get("sort", "relevance" if search else "newest")
+    cursor = request.args.get("cursor")
+    include_total = request.args.get("include_total", "").lower() in ("1", "true", "yes")
+    page = max(request.args.get("page", 1, type=int), 1)
+    limit = min(max(request.args.get("limit", 20, type=int), 1), MAX_PAGE_SIZE)
+
+    # Anonymous reads of the same page are served from the feed cache;
+    # list-level tag versions are read before the page is built so a write
+    # landing mid-build can't be cached as current
+    cache_key = None
+    if feed_cache.enabled and not current_user.is_authenticated:
+        cache_key = _feed_cache_key(category, search, sort, cursor, page, limit, include_total)
+        cached = feed_cache.get(cache_key)
+        if cached is not None:
+            response = jsonify(cached)
+            response.headers["X-Cache"] = "HIT"
+            return response
+        tag_versions = feed_cache.versions(_feed_tags(category, search, sort))
+
+    try:
+        body = _build_feed(category, search, sort, cursor, page, limit, include_total)
+    except InvalidCursor:
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    response = jsonify(body)
+    if cache_key is not None:
+        tag_versions.update(feed_cache.versions(f"post:{p['id']}" for p in body["posts"]))
+        feed_cache.set(cache_key, body, tag_versions)
+        response.headers["X-Cache"] = "MISS"
+    return response
+
+def _feed_cache_key(category, search, sort, cursor, page, limit, include_total):
+    position = f"c={cursor}" if cursor else f"p={page}"
+    return "|".join(["feed", category or "*", sort, search.lower(), position, str(limit), str(int(include_total))])
+
+def _feed_tags(category, search, sort):
+    scope = category or "*"
+    tags = [f"posts:{scope}"]
+    if sort in ("popular", "hot"):
+        tags.append(f"rank:{scope}")
+    if sort == "hot":
+        tags.append("hot")
+    if search:
+        tags.append("search")
+    return tags
 
-    q = Post.query.filter_by(is_deleted=False)
+def _build_feed(category, search, sort, cursor, page, limit, include_total):
+    # Only the columns the feed serializes; content_md is never loaded here
+    q = db.session.query(*FEED_COLUMNS).filter(Post.is_deleted == False)
 
     # Filter by category
     if category:
-        q = q.filter_by(category=category)
+        q = q.filter(Post.category == category)
 
-    # Search in title and content
-    if search:
+    # Search in title and content through the full-text index, falling back
+    # to ILIKE where no index is available
+    hits = search_hits(search) if search else None
+    if hits is not None:
+        # Filter with IN so counts are driven from the index; the relevance
+        # score is joined in below only for ordering
+        q = q.filter(Post.id.in_(db.select(hits.c.post_id)))
+    elif search:
         search_pattern = f"%{search}%"
         q = q.filter(
             db.or_(
@@ -35,35 +134,85 @@ def list_posts():
                 Post.content_md.ilike(search_pattern)
             )
         )
+    if sort == "relevance" and hits is None:
+        sort = "newest"
+
+    filtered = q
+    if hits is not None:
+        q = q.join(hits, hits.c.post_id == Post.id).add_columns(hits.c.score)
 
-    # Sort
+    # Sort; the cursor carries the full sort key so the next page starts
+    # exactly after the last row instead of re-scanning `offset` rows
     if sort == "popular":
-        q = q.outerjoin(Reaction, (Reaction.post_id == Post.id) & (Reaction.comment_id == None))
-        q = q.group_by(Post.id)
-        q = q.order_by(func.count(Reaction.id).desc(), Post.created_at.desc())
+        keys = [Post.reaction_count, Post.created_at, Post.id]
+        kinds = [int, datetime, int]
+    elif sort == "hot":
+        keys = [Post.hot_score, Post.created_at, Post.id]
+        kinds = [float, datetime, int]
+    elif sort == "relevance":
+        keys = [hits.c.score, Post.id]
+        kinds = [float, int]
     else:
-        q = q.order_by(Post.created_at.desc())
+        keys = [Post.created_at, Post.id]
+        kinds = [datetime, int]
+    q = q.order_by(*[k.desc() for k in keys])
+
+    if cursor:
+        q = q.filter(keyset_filter(keys, decode_cursor(cursor, kinds)))
+    else:
+        q = q.offset((page - 1) * limit)
+
+    rows = q.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        sort_key = [last.created_at, last.id]
+        if sort == "popular":
+            sort_key.insert(0, last.reaction_count)
+        elif sort == "hot":
+            sort_key.insert(0, last.hot_score)
+        elif sort == "relevance":
+            sort_key = [last.score, last.id]
+        next_cursor = encode_cursor(*sort_key)
+
+    # Authors and cover images for the whole page in one query each
+    authors = user_cards.get_many(p.user_id for p in rows)
+    covers = _covers([p.id for p in rows])
+    snippets = search_snippets(search, [p.id for p in rows]) if hits is not None else None
 
-    total = q.count()
-    q = q.offset(offset).limit(limit)
-    
     posts = []
-    for p in q.all():
-        user = db.session.get(User, p.user_id)
-        media = Media.query.filter_by(post_id=p.id, type="image").all()
-        preview_url = media[0].url if media else None
+    for p in rows:
+        cover = covers.get(p.id)
         posts.append({
             "id": p.id,
             "title": p.title,
             "category": p.category,
             "user_id": p.user_id,
-            "user_name": user.name if user else "Unknown",
+            "user_name": authors[p.user_id]["name"],
+            "author": authors[p.user_id],
             "created_at": p.created_at.isoformat(),
             "edited_at": p.edited_at.isoformat() if p.edited_at else None,
-            "cover_url": preview_url,
+            "cover_url": cover.url if cover else None,
+            "cover_srcset": srcset(cover.derivatives) if cover else None,
+            # Lets clients size the card and paint a placeholder before the image loads
+            "cover": placeholder(cover) if cover else None,
         })
+        if snippets is not None:
+            posts[-1]["snippet"] = snippets.get(p.id)
 
-    return jsonify({"posts": posts, "total": total, "page": page, "limit": limit})
+    body = {"posts": posts, "limit": limit, "next_cursor": next_cursor}
+    if include_total:
+        body["total"] = filtered.count()
+    elif not cursor:
+        # Page mode keeps reporting a total for existing clients, served from
+        # a cache dropped by post writes rather than an exact count per request
+        body["total"] = _feed_total(filtered, category, search)
+    if not cursor:
+        body["page"] = page
+    return body
 
 @posts_bp.post("")
 @login_required
@@ -81,19 +230,37 @@ def create_post():
         content_md=content_md,
         content_html=clean(content_md, strip=True),
         category=category,
+        hot_score=hot_score(0, 0, datetime.utcnow()),
     )
     db.session.add(post)
     db.session.commit()
+    feed_cache.invalidate(*post_tags(category=category, listing=True, content=True))
     return jsonify({"id": post.id}), 201
 
 @posts_bp.get("/<int:post_id>")
 @limiter.limit("120/hour")
 def get_post(post_id):
-    post = Post.query.get_or_404(post_id)
-    if post.is_deleted:
+    # Validate against version columns before loading the body
+    version = db.session.query(Post.is_deleted, Post.created_at, Post.edited_at)\
+        .filter(Post.id == post_id).first()
+    if version is None:
+        abort(404)
+    if version.is_deleted:
         return jsonify({"error": "Post deleted"}), 404
+    # Derivatives land after the upload, so count them into the validators
+    latest_media, processed_media = db.session.query(func.max(Media.id), func.count(Media.derivatives))\
+        .filter(Media.post_id == post_id).one()
+    validators = Validators(
+        "post", post_id, version.created_at, version.edited_at, latest_media, processed_media,
+        last_modified=version.edited_at or version.created_at,
+    )
+    not_modified = validators.not_modified()
+    if not_modified:
+        return not_modified
+
+    post = db.session.get(Post, post_id)
     media = Media.query.filter_by(post_id=post.id).all()
-    return jsonify({
+    return validators.apply(jsonify({
         "id": post.id,
         "title": post.title,
         "content_md": post.content_md,
@@ -101,8 +268,11 @@ def get_post(post_id):
         "category": post.category,
         "created_at": post.created_at.isoformat(),
         "edited_at": post.edited_at.isoformat() if post.edited_at else None,
-        "media": [{"id": m.id, "url": m.url, "type": m.type} for m in media]
-    })
+        "media": [
+            {"id": m.id, "url": m.url, "type": m.type, "srcset": srcset(m.derivatives), **placeholder(m)}
+            for m in media
+        ]
+    }))
 
 @posts_bp.patch("/<int:post_id>")
 @login_required
@@ -115,6 +285,7 @@ def edit_post(post_id):
     title = data.get("title")
     content_md = data.get("content_md")
     category = data.get("category")
+    old_category = post.category
     if title is not None:
         post.title = title.strip() or post.title
     if content_md is not None:
@@ -124,6 +295,10 @@ def edit_post(post_id):
         post.category = category
     post.edited_at = datetime.utcnow()
     db.session.commit()
+    tags = post_tags(post.id, post.category, content=True)
+    if post.category != old_category:
+        tags += post_tags(category=old_category, listing=True) + post_tags(category=post.category, listing=True)
+    feed_cache.invalidate(*tags)
     return jsonify({"message": "Post updated"})
 
 @posts_bp.delete("/<int:post_id>")
@@ -146,10 +321,14 @@ def delete_post(post_id):
     # Delete all comments
     Comment.query.filter_by(post_id=post.id).delete()
     
-    # Delete all media
+    # Delete all media; the files go once no other upload shares them
+    blob_refs = [sha for (sha,) in db.session.query(Media.blob_sha256).filter_by(post_id=post.id)]
     Media.query.filter_by(post_id=post.id).delete()
     
     # Delete the post
+    tags = post_tags(post.id, post.category, listing=True, content=True)
     db.session.delete(post)
     db.session.commit()
+    feed_cache.invalidate(*tags)
+    blobs.release(blob_refs)
     return jsonify({"message": "Post deleted"})
@@ -1,15 +1,36 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_login import login_required, current_user
-from sqlalchemy import func
-from ..extensions import db, limiter
-from ..models.reaction import Reaction
+from ..extensions import db, limiter, reaction_buffer
+from ..models.reaction import Reaction, REACTION_TYPES
 from ..models.post import Post
 from ..models.comment import Comment
-from ..models.notification import Notification
+from ..services import reactions
+from ..services.conditional import Validators
+from ..services.counters import invalidate_ranking
 
 reactions_bp = Blueprint("reactions", __name__)
 
-ALLOWED_REACTION_TYPES = ["like", "helpful", "funny", "insightful", "celebrate"]
+ALLOWED_REACTION_TYPES = list(REACTION_TYPES)
+
+def _counter_columns(model):
+    return [model.counter_column(t) for t in REACTION_TYPES]
+
+def _target_kwargs(kind, target_id):
+    return {"comment_id": target_id} if kind == "comment" else {"post_id": target_id}
+
+def _validators(kind, target_id, row):
+    # The body includes the caller's own reactions, so the ETag is per user,
+    # and their still-buffered toggles have to change it too
+    viewer = current_user.id if current_user.is_authenticated else None
+    version = row.reaction_version if row else None
+    pending = None
+    if viewer and reaction_buffer.enabled:
+        pending = sorted(reaction_buffer.pending_for(viewer, **_target_kwargs(kind, target_id)).items())
+    return Validators("reactions", kind, target_id, version, viewer, pending, private=True)
+
+def _overlay_pending(kind, target_id, counts, user_reactions):
+    if current_user.is_authenticated and reaction_buffer.enabled:
+        reaction_buffer.overlay(current_user.id, counts, user_reactions, **_target_kwargs(kind, target_id))
 
 @reactions_bp.post("")
 @login_required
@@ -25,53 +46,22 @@ def add_reaction():
     
     if not post_id and not comment_id:
         return jsonify({"error": "Target required"}), 400
+
+    if reaction_buffer.enabled:
+        reaction_buffer.enqueue(current_user, post_id, comment_id, type_, present=True)
+        return jsonify({"message": "Reaction queued"}), 202
     
-    # Check if reaction already exists - if so, just return success
-    existing = Reaction.query.filter_by(
-        post_id=post_id, 
-        comment_id=comment_id, 
-        user_id=current_user.id, 
-        type=type_
-    ).first()
-    
-    if existing:
-        return jsonify({"id": existing.id, "message": "Already reacted"}), 200
-    
-    reaction = Reaction(post_id=post_id, comment_id=comment_id, user_id=current_user.id, type=type_)
+    # One insert-or-ignore transaction; a repeat click or a racing duplicate
+    # is absorbed by the unique index instead of failing
     try:
-        db.session.add(reaction)
-        db.session.commit()
-        
-        # Create notification for post/comment author
-        if post_id:
-            post = db.session.get(Post, post_id)
-            if post and post.user_id != current_user.id:
-                notification = Notification(
-                    user_id=post.user_id,
-                    type="post_reaction",
-                    content=f"{current_user.name} reacted {type_} to your post",
-                    post_id=post_id,
-                    actor_id=current_user.id,
-                )
-                db.session.add(notification)
-        elif comment_id:
-            comment = db.session.get(Comment, comment_id)
-            if comment and comment.user_id != current_user.id:
-                notification = Notification(
-                    user_id=comment.user_id,
-                    type="comment_reaction",
-                    content=f"{current_user.name} reacted {type_} to your comment",
-                    post_id=comment.post_id,
-                    comment_id=comment_id,
-                    actor_id=current_user.id,
-                )
-                db.session.add(notification)
-        
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
-        return jsonify({"error": "Duplicate reaction or invalid"}), 400
-    return jsonify({"id": reaction.id}), 201
+        reaction_id, created = reactions.add_reaction(current_user, post_id, comment_id, type_)
+    except reactions.TargetNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    if not created:
+        return jsonify({"id": reaction_id, "message": "Already reacted"}), 200
+    if not comment_id:
+        invalidate_ranking(post_id)
+    return jsonify({"id": reaction_id}), 201
 
 @reactions_bp.delete("")
 @login_required
@@ -81,52 +71,120 @@ def remove_reaction():
     post_id = data.get("post_id")
     comment_id = data.get("comment_id")
     type_ = data.get("type") or "like"
-    r = Reaction.query.filter_by(post_id=post_id, comment_id=comment_id, user_id=current_user.id, type=type_).first()
-    if not r:
+    if reaction_buffer.enabled:
+        if type_ not in ALLOWED_REACTION_TYPES:
+            return jsonify({"error": f"Invalid reaction type. Allowed: {ALLOWED_REACTION_TYPES}"}), 400
+        if not post_id and not comment_id:
+            return jsonify({"error": "Target required"}), 400
+        reaction_buffer.enqueue(current_user, post_id, comment_id, type_, present=False)
+        return jsonify({"message": "Reaction removal queued"}), 202
+    if not reactions.remove_reaction(current_user, post_id, comment_id, type_):
         return jsonify({"error": "Reaction not found"}), 404
-    db.session.delete(r)
-    db.session.commit()
+    if not comment_id:
+        invalidate_ranking(post_id)
     return jsonify({"message": "Reaction removed"})
 
+def _summary_ids(data, key):
+    ids = data.get(key) or []
+    if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        raise ValueError(f"{key} must be a list of integer ids")
+    return list(dict.fromkeys(ids))
+
+def _summaries(model, ids, mine):
+    rows = db.session.query(model.id, *_counter_columns(model)).filter(model.id.in_(ids)).all() if ids else []
+    summaries = {}
+    for row in rows:
+        counts = model.reaction_counts(row)
+        summaries[str(row.id)] = {
+            "counts": counts,
+            "user_reactions": mine.get(row.id, []),
+            "total": sum(counts.values()),
+        }
+    return summaries
+
+@reactions_bp.post("/summary")
+@limiter.limit("120/hour")
+def reaction_summary():
+    """Counts and the caller's own reactions for a page of posts and comments.
+
+    Answers with at most four queries however many ids are asked for: the
+    post and comment counters, and the caller's reactions on each.
+    """
+    data = request.json or {}
+    try:
+        post_ids = _summary_ids(data, "post_ids")
+        comment_ids = _summary_ids(data, "comment_ids")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    max_ids = current_app.config["REACTION_SUMMARY_MAX_IDS"]
+    if len(post_ids) + len(comment_ids) > max_ids:
+        return jsonify({"error": f"At most {max_ids} ids per request"}), 400
+
+    mine_posts, mine_comments = {}, {}
+    if current_user.is_authenticated:
+        if post_ids:
+            for target_id, type_ in db.session.query(Reaction.post_id, Reaction.type).filter(
+                Reaction.user_id == current_user.id,
+                Reaction.post_id.in_(post_ids),
+                Reaction.comment_id == None,
+            ):
+                mine_posts.setdefault(target_id, []).append(type_)
+        if comment_ids:
+            for target_id, type_ in db.session.query(Reaction.comment_id, Reaction.type).filter(
+                Reaction.user_id == current_user.id,
+                Reaction.comment_id.in_(comment_ids),
+            ):
+                mine_comments.setdefault(target_id, []).append(type_)
+
+    summaries = {
+        "posts": _summaries(Post, post_ids, mine_posts),
+        "comments": _summaries(Comment, comment_ids, mine_comments),
+    }
+    for kind, key in (("post", "posts"), ("comment", "comments")):
+        for target_id, summary in summaries[key].items():
+            _overlay_pending(kind, int(target_id), summary["counts"], summary["user_reactions"])
+            summary["total"] = sum(summary["counts"].values())
+    return jsonify(summaries)
+
 @reactions_bp.get("/post/<int:post_id>")
 @limiter.limit("120/hour")
 def get_post_reactions(post_id):
-    # Get reaction counts grouped by type
-    counts = db.session.query(
-        Reaction.type, 
-        func.count(Reaction.id).label('count')
-    ).filter_by(
-        post_id=post_id
-    ).group_by(Reaction.type).all()
-    
-    reaction_counts = {type_: count for type_, count in counts}
+    # Counts come from the post's denormalized counters; reaction_version
+    # lets an unchanged summary be answered with a 304
+    post = db.session.query(*_counter_columns(Post), Post.reaction_version).filter(Post.id == post_id).first()
+    validators = _validators("post", post_id, post)
+    not_modified = validators.not_modified()
+    if not_modified:
+        return not_modified
+    reaction_counts = Post.reaction_counts(post) if post else {}
     
     # Get current user's reactions if authenticated
     user_reactions = []
     if current_user.is_authenticated:
         user_reactions = [r.type for r in Reaction.query.filter_by(
             post_id=post_id, 
+            comment_id=None,
             user_id=current_user.id
         ).all()]
+    _overlay_pending("post", post_id, reaction_counts, user_reactions)
     
-    return jsonify({
+    return validators.apply(jsonify({
         "counts": reaction_counts,
         "user_reactions": user_reactions,
         "total": sum(reaction_counts.values())
-    })
+    }))
 
 @reactions_bp.get("/comment/<int:comment_id>")
 @limiter.limit("120/hour")
 def get_comment_reactions(comment_id):
-    # Get reaction counts grouped by type
-    counts = db.session.query(
-        Reaction.type, 
-        func.count(Reaction.id).label('count')
-    ).filter_by(
-        comment_id=comment_id
-    ).group_by(Reaction.type).all()
-    
-    reaction_counts = {type_: count for type_, count in counts}
+    # Counts come from the comment's denormalized counters
+    comment = db.session.query(*_counter_columns(Comment), Comment.reaction_version)\
+        .filter(Comment.id == comment_id).first()
+    validators = _validators("comment", comment_id, comment)
+    not_modified = validators.not_modified()
+    if not_modified:
+        return not_modified
+    reaction_counts = Comment.reaction_counts(comment) if comment else {}
     
     # Get current user's reactions if authenticated
     user_reactions = []
@@ -135,9 +193,10 @@ def get_comment_reactions(comment_id):
             comment_id=comment_id, 
             user_id=current_user.id
         ).all()]
+    _overlay_pending("comment", comment_id, reaction_counts, user_reactions)
     
-    return jsonify({
+    return validators.apply(jsonify({
         "counts": reaction_counts,
         "user_reactions": user_reactions,
         "total": sum(reaction_counts.values())
-    })
+    }))
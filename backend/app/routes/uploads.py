@@ -0,0 +1,47 @@
+import mimetypes
+import os
+from flask import Blueprint, abort, current_app, send_from_directory
+from werkzeug.security import safe_join
+from ..extensions import storage
+
+uploads_bp = Blueprint("uploads", __name__)
+
+
+@uploads_bp.get("/<path:filename>")
+def uploaded_file(filename):
+    """Serve an upload. Names are content hashes or uuids and never change,
+    so responses are immutable for a year, with the name as a strong ETag.
+
+    UPLOADS_SERVE_MODE "flask" streams the file from this process, with
+    Range support; "x-accel" (nginx) and "x-sendfile" (Apache, lighttpd)
+    only return a header telling the fronting server which file to send.
+    """
+    name = os.path.basename(filename)
+    if name.startswith(".") or name.endswith(".deleted"):
+        abort(404)  # in-progress spools and files being deleted
+    config = current_app.config
+    mode = config["UPLOADS_SERVE_MODE"]
+    key = storage.resolve(filename)
+    max_age = config["UPLOADS_CACHE_MAX_AGE"]
+
+    if mode == "flask":
+        response = send_from_directory(
+            storage.root, key,
+            max_age=max_age, etag=os.path.splitext(name)[0], conditional=True,
+        )
+    else:
+        path = safe_join(storage.root, key)
+        if path is None:
+            abort(404)
+        if mode == "x-accel":
+            header, target = "X-Accel-Redirect", config["UPLOADS_ACCEL_PREFIX"].rstrip("/") + "/" + key
+        else:
+            header, target = "X-Sendfile", path
+        response = current_app.response_class(
+            mimetype=mimetypes.guess_type(name)[0] or "application/octet-stream",
+        )
+        response.headers[header] = target
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    response.cache_control.immutable = True
+    return response
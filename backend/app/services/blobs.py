@@ -0,0 +1,173 @@
+import glob
+import hashlib
+import os
+import tempfile
+from collections import Counter
+from uuid import uuid4
+from flask import Request, current_app
+from sqlalchemy import bindparam, delete, update
+from werkzeug.exceptions import RequestEntityTooLarge
+from ..extensions import db, storage
+from ..models.post import Blob
+from .images import derivative_name
+from .schema import insert_ignore
+
+# Blob files are named after their hash, with the extension taken from the
+# MIME type rather than the client's filename, so the same bytes always map
+# to the same file
+MIME_EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/webp": ".webp",
+    "application/pdf": ".pdf",
+}
+
+
+class HashingUpload:
+    """Spool file for one upload, created inside UPLOAD_FOLDER.
+
+    Werkzeug's form parser writes the upload into it chunk by chunk while
+    the SHA-256 is computed, and the request is aborted with 413 as soon as
+    the file passes `limit`. The spool is removed on close unless
+    `persist()` already moved it into place.
+    """
+
+    def __init__(self, directory, limit):
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+        self._file = os.fdopen(fd, "w+b")
+        self._hash = hashlib.sha256()
+        self.limit = limit
+        self.size = 0
+
+    def __getattr__(self, name):
+        # read/seek/tell etc. for FileStorage
+        return getattr(self._file, name)
+
+    def write(self, data):
+        self.size += len(data)
+        if self.limit and self.size > self.limit:
+            self.close()
+            raise RequestEntityTooLarge()
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def persist(self, path):
+        """Move the spooled bytes to `path`"""
+        self._file.close()
+        os.replace(self.path, path)
+        self.path = None
+
+    def close(self):
+        self._file.close()
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+
+class UploadRequest(Request):
+    """Request class that spools file uploads through HashingUpload"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        limit = current_app.config.get("MAX_CONTENT_LENGTH")
+        if limit and content_length and content_length > limit:
+            raise RequestEntityTooLarge()
+        upload = HashingUpload(storage.root, limit)
+        # Tracked here too: a parse that fails midway never hands it to request.files
+        self.__dict__.setdefault("_uploads", []).append(upload)
+        return upload
+
+    def close(self):
+        super().close()
+        for upload in self.__dict__.pop("_uploads", ()):
+            upload.close()
+
+
+def blob_path(blob):
+    return storage.path(blob.path)
+
+
+def blob_url(blob):
+    return storage.url(blob.path)
+
+
+def derivative_paths(path):
+    """Resized copies of the file at `path` (services/images.py), which sit beside it"""
+    return glob.glob(derivative_name(glob.escape(os.path.splitext(path)[0]), "*"))
+
+
+def acquire(upload, mime):
+    """Take a reference on the blob holding the upload's bytes, creating the
+    row if they are new, in the caller's transaction.
+
+    Call `place()` once that transaction has committed.
+    """
+    sha256 = upload.hexdigest()
+    created = insert_ignore(Blob, {
+        "sha256": sha256,
+        "path": storage.key_for(f"{sha256}{MIME_EXTENSIONS.get(mime, '')}"),
+        "size_bytes": upload.size,
+        "ref_count": 1,
+    })
+    if created is None:
+        db.session.execute(
+            update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count + 1)
+        )
+    return db.session.get(Blob, sha256)
+
+
+def place(upload, blob):
+    """Put the upload's bytes at the blob's path unless a copy is already there"""
+    path = blob_path(blob)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        upload.persist(path)
+
+
+def release(sha256s):
+    """Drop one reference per item of `sha256s` and delete blobs left without any.
+
+    Run after the Media rows are committed away, in its own transaction, so
+    a failure here can leak a blob but never lose one still in use. Files
+    are renamed aside before the commit and only removed after it; an upload
+    that recreates the blob afterwards finds the path free and writes it anew.
+    """
+    counts = Counter(sha for sha in sha256s if sha)
+    if not counts:
+        return 0
+    stmt = update(Blob).where(Blob.sha256 == bindparam("sha"))\
+        .values(ref_count=Blob.ref_count - bindparam("n"))\
+        .execution_options(synchronize_session=False)
+    db.session.connection().execute(stmt, [{"sha": sha, "n": n} for sha, n in counts.items()])
+
+    unreferenced = db.session.query(Blob.sha256, Blob.path)\
+        .filter(Blob.sha256.in_(counts), Blob.ref_count <= 0).all()
+    removed, trashed = 0, []
+    try:
+        for sha256, path in unreferenced:
+            # Recheck under the row lock: a concurrent upload may have taken a reference
+            result = db.session.execute(delete(Blob).where(Blob.sha256 == sha256, Blob.ref_count <= 0))
+            if result.rowcount != 1:
+                continue
+            removed += 1
+            path = storage.path(path)
+            for victim in [path] + derivative_paths(path):
+                if os.path.exists(victim):
+                    trash = f"{victim}.{uuid4().hex}.deleted"
+                    os.replace(victim, trash)
+                    trashed.append((trash, victim))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        for trash, path in trashed:
+            os.replace(trash, path)
+        raise
+    for trash, _ in trashed:
+        os.remove(trash)
+    return removed
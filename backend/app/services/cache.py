@@ -0,0 +1,192 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from .local_sqlite import LocalSQLite
+
+
+class MemoryBackend:
+    """Per-process LRU store with TTL; fine for a single worker."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def versions(self, tags):
+        with self._lock:
+            return {tag: self._versions.get(tag, 0) for tag in tags}
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def size(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """LRU store in a local SQLite file, shared by every worker on the host."""
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._sqlite = LocalSQLite(path, timeout=5, schema=[
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS ix_entries_accessed ON entries (accessed_at)",
+            "CREATE TABLE IF NOT EXISTS tag_versions (tag TEXT PRIMARY KEY, version INTEGER NOT NULL)",
+        ])
+
+    def get(self, key):
+        conn = self._sqlite.conn()
+        now = time.time()
+        row = conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, entry, ttl):
+        conn = self._sqlite.conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(entry, separators=(",", ":")), now + ttl, now),
+        )
+        overflow = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+
+    def delete(self, key):
+        self._sqlite.conn().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def versions(self, tags):
+        found = dict(self._sqlite.conn().execute(
+            f"SELECT tag, version FROM tag_versions WHERE tag IN ({','.join('?' * len(tags))})", list(tags)
+        ).fetchall()) if tags else {}
+        return {tag: found.get(tag, 0) for tag in tags}
+
+    def bump(self, tags):
+        self._sqlite.conn().executemany(
+            "INSERT INTO tag_versions (tag, version) VALUES (?, 1) "
+            "ON CONFLICT(tag) DO UPDATE SET version = version + 1",
+            [(tag,) for tag in tags],
+        )
+
+    def size(self):
+        return self._sqlite.conn().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class ResponseCache:
+    """Cache of serialized responses with tag-based invalidation.
+
+    Each entry records the version of every tag it depends on when it was
+    stored; invalidating a tag bumps its version, so any entry built from
+    older data stops matching on its next read. This works the same across
+    processes with the shared SQLite backend.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.ttl = 0
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        kind = app.config.get("FEED_CACHE_BACKEND", "memory")
+        max_entries = app.config.get("FEED_CACHE_MAX_ENTRIES", 1024)
+        self.ttl = app.config.get("FEED_CACHE_TTL", 30)
+        if kind == "memory":
+            self.backend = MemoryBackend(max_entries)
+        elif kind == "sqlite":
+            self.backend = SQLiteBackend(app.config["FEED_CACHE_PATH"], max_entries)
+        else:
+            self.backend = None
+        app.extensions["feed_cache"] = self
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def versions(self, tags):
+        """Current versions of `tags`; snapshot these before building a value"""
+        return self.backend.versions(list(tags)) if self.enabled else {}
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        entry = self.backend.get(key)
+        if entry is not None and self.backend.versions(list(entry["tags"])) == entry["tags"]:
+            self.hits += 1
+            return entry["value"]
+        if entry is not None:
+            self.backend.delete(key)
+        self.misses += 1
+        return None
+
+    def set(self, key, value, tag_versions):
+        if self.enabled:
+            self.backend.set(key, {"tags": tag_versions, "value": value}, self.ttl)
+
+    def invalidate(self, *tags):
+        if self.enabled and tags:
+            self.backend.bump(set(tags))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "entries": self.backend.size() if self.enabled else 0,
+        }
+
+
+def post_tags(post_id=None, category=None, listing=False, ranking=False, content=False):
+    """Feed cache tags touched by a change to one post.
+
+    listing: the post joined or left a list (create, delete, category move)
+    ranking: its reaction/comment counters moved (popular and hot order)
+    content: its searchable text changed
+    """
+    tags = [f"post:{post_id}"] if post_id else []
+    for scope in ("*", category) if category else ("*",):
+        if listing:
+            tags.append(f"posts:{scope}")
+        if ranking:
+            tags.append(f"rank:{scope}")
+    if content:
+        tags.append("search")
+    return tags
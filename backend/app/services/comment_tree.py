@@ -0,0 +1,130 @@
+from sqlalchemy import and_, bindparam, or_, update
+from ..extensions import db, user_cards
+from ..models.comment import Comment
+
+# Comment.path is the concatenation of fixed-width base36 ids from the root
+# down to the comment itself, e.g. "000000a" / "000000a000002f". Digits sort
+# before letters in ASCII, so plain string order is numeric order per level
+# and `ORDER BY path` yields depth-first display order with siblings in id
+# (creation) order. A subtree is the contiguous range starting at its path.
+PATH_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
+PATH_SEGMENT_WIDTH = 7
+MAX_PATH_ID = len(PATH_ALPHABET) ** PATH_SEGMENT_WIDTH - 1
+_PATH_END = "~"  # sorts after every alphabet character
+
+
+def encode_segment(comment_id):
+    if not 0 < comment_id <= MAX_PATH_ID:
+        raise ValueError(f"Comment id {comment_id} does not fit a {PATH_SEGMENT_WIDTH}-char path segment")
+    digits = []
+    while comment_id:
+        comment_id, rem = divmod(comment_id, len(PATH_ALPHABET))
+        digits.append(PATH_ALPHABET[rem])
+    return "".join(reversed(digits)).rjust(PATH_SEGMENT_WIDTH, "0")
+
+
+def comment_path(parent_path, comment_id):
+    """Path of a comment given its parent's path (None for top-level)"""
+    return (parent_path or "") + encode_segment(comment_id)
+
+
+def max_nesting(config):
+    """Deepest allowed reply level: the configured limit, capped by how many
+    segments fit in the path column"""
+    capacity = Comment.path.type.length // PATH_SEGMENT_WIDTH - 1
+    return min(config["COMMENTS_MAX_NESTING"], capacity)
+
+
+def descendants_range(comment):
+    """Exclusive (lo, hi) bounds of Comment.path covering every descendant"""
+    return comment.path, comment.path + _PATH_END
+
+
+def load_descendants(post_id, roots, max_depth):
+    """Non-deleted replies under `roots` down to absolute depth `max_depth`,
+    in depth-first order, fetched with one path range scan per root."""
+    if not roots:
+        return []
+    ranges = [and_(Comment.path > lo, Comment.path < hi) for lo, hi in map(descendants_range, roots)]
+    return Comment.query.filter(
+        Comment.post_id == post_id,
+        Comment.is_deleted == False,
+        Comment.depth <= max_depth,
+        or_(*ranges),
+    ).order_by(Comment.path.asc()).all()
+
+
+def build_forest(roots, descendants, max_depth):
+    """Nest `descendants` under `roots`.
+
+    Replies deeper than `max_depth` are not loaded; a comment at the depth
+    limit instead carries `more_replies`, its reply count, so the client can
+    fetch that branch through the subtree endpoint.
+    """
+    comments = list(roots) + list(descendants)
+    authors = user_cards.get_many(c.user_id for c in comments)
+
+    nodes = {}
+    for c in comments:
+        nodes[c.id] = {
+            "id": c.id,
+            "post_id": c.post_id,
+            "parent_id": c.parent_id,
+            "user_id": c.user_id,
+            "user_name": authors[c.user_id]["name"],
+            "author": authors[c.user_id],
+            "content": c.content,
+            "depth": c.depth,
+            "created_at": c.created_at.isoformat(),
+            "reply_count": c.reply_count,
+            "replies": [],
+        }
+        if c.depth >= max_depth and c.reply_count:
+            nodes[c.id]["more_replies"] = c.reply_count
+
+    for c in descendants:
+        # Replies under a deleted comment have no loaded parent and are
+        # dropped, as in the full tree
+        if c.parent_id in nodes:
+            nodes[c.parent_id]["replies"].append(nodes[c.id])
+    return [nodes[r.id] for r in roots]
+
+
+def migrate_comment_paths(batch_size=1000):
+    """Rewrite every Comment.path into the fixed-width encoding.
+
+    Works one depth level at a time so each parent is already rewritten
+    before its children; each batch commits on its own, and re-running the
+    migration is safe. Returns the number of comments rewritten.
+    """
+    stmt = update(Comment).where(Comment.id == bindparam("cid")).values(path=bindparam("new_path"))\
+        .execution_options(synchronize_session=False)
+    rewritten = 0
+    depth = 0
+    while True:
+        last_id = 0
+        level_rows = 0
+        while True:
+            rows = db.session.query(Comment.id, Comment.parent_id, Comment.path)\
+                .filter(db.func.coalesce(Comment.depth, 0) == depth, Comment.id > last_id)\
+                .order_by(Comment.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            level_rows += len(rows)
+            parent_ids = {r.parent_id for r in rows if r.parent_id}
+            parents = dict(
+                db.session.query(Comment.id, Comment.path).filter(Comment.id.in_(parent_ids))
+            ) if parent_ids else {}
+            params = []
+            for r in rows:
+                new_path = comment_path(parents.get(r.parent_id), r.id)
+                if new_path != r.path:
+                    params.append({"cid": r.id, "new_path": new_path})
+            if params:
+                db.session.connection().execute(stmt, params)
+                rewritten += len(params)
+            db.session.commit()
+        if not level_rows:
+            return rewritten
+        depth += 1
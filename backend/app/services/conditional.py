@@ -0,0 +1,40 @@
+import hashlib
+from datetime import timezone
+from flask import current_app, request
+
+
+class Validators:
+    """Strong ETag / Last-Modified validators built from cheap version data.
+
+    Check `not_modified()` before loading anything expensive; it returns a
+    ready 304 response when the client's copy is current. Otherwise build
+    the body and pass the response through `apply()`.
+    """
+
+    def __init__(self, *version_parts, last_modified=None, private=False):
+        digest = hashlib.sha1(repr(version_parts).encode()).hexdigest()[:32]
+        self.etag = digest
+        self.last_modified = last_modified.replace(microsecond=0, tzinfo=timezone.utc) if last_modified else None
+        self.private = private
+
+    def _is_fresh(self):
+        if request.if_none_match:
+            return request.if_none_match.contains(self.etag)
+        since = request.if_modified_since
+        return bool(since and self.last_modified and self.last_modified <= since)
+
+    def not_modified(self):
+        if request.method not in ("GET", "HEAD") or not self._is_fresh():
+            return None
+        return self.apply(current_app.response_class(status=304))
+
+    def apply(self, response):
+        response.set_etag(self.etag)
+        if self.last_modified:
+            response.last_modified = self.last_modified
+        # Clients may keep the body but must revalidate before reusing it
+        response.cache_control.no_cache = True
+        if self.private:
+            response.cache_control.private = True
+            response.vary.add("Cookie")
+        return response
@@ -0,0 +1,130 @@
+from datetime import datetime
+from sqlalchemy import func, update
+from ..extensions import db, feed_cache
+from ..models.comment import Comment
+from ..models.post import Post
+from ..models.reaction import Reaction, REACTION_TYPES
+from .cache import post_tags
+from .ranking import refresh_hot_score
+
+
+def bump_reaction(post_id, comment_id, type_, delta):
+    """Adjust the per-type and total reaction counters of the reaction target.
+
+    Issued as an in-place `col = col + delta` UPDATE in the caller's
+    transaction, so concurrent reactions never overwrite each other.
+    """
+    model, target_id = (Comment, comment_id) if comment_id else (Post, post_id)
+    column = model.counter_column(type_)
+    db.session.execute(
+        update(model)
+        .where(model.id == target_id)
+        .values({
+            column: column + delta,
+            model.reaction_count: model.reaction_count + delta,
+            model.reaction_version: model.reaction_version + 1,
+        })
+    )
+    if model is Post:
+        refresh_hot_score(post_id)
+
+
+def bump_comment(post_id, parent_id, delta):
+    """Adjust the post's comment counter and the parent's reply counter"""
+    db.session.execute(
+        update(Post).where(Post.id == post_id)
+        .values(comment_count=Post.comment_count + delta, last_comment_at=datetime.utcnow())
+    )
+    refresh_hot_score(post_id)
+    if parent_id:
+        db.session.execute(
+            update(Comment).where(Comment.id == parent_id).values(reply_count=Comment.reply_count + delta)
+        )
+
+
+def touch_comment_tree(post_id):
+    """Mark the post's comment tree as changed without moving any counter"""
+    db.session.execute(update(Post).where(Post.id == post_id).values(last_comment_at=datetime.utcnow()))
+
+
+def invalidate_ranking(post_id):
+    """Drop cached popular/hot feed pages that the post's new counters may
+    reorder. Call after the counter change has been committed."""
+    category = db.session.query(Post.category).filter(Post.id == post_id).scalar()
+    feed_cache.invalidate(*post_tags(category=category, ranking=True))
+
+
+def _reaction_tallies(column, ids, extra_filter=None):
+    q = db.session.query(column, Reaction.type, func.count(Reaction.id))\
+        .filter(column.in_(ids))
+    if extra_filter is not None:
+        q = q.filter(extra_filter)
+    tallies = {}
+    for target_id, type_, count in q.group_by(column, Reaction.type):
+        tallies.setdefault(target_id, {})[type_] = count
+    return tallies
+
+
+def _repair(model, rows, reactions, children, child_column):
+    """Rewrite drifted counters in place; returns the repaired rows"""
+    repaired = []
+    for row in rows:
+        expected = {f"{t}_count": reactions.get(row.id, {}).get(t, 0) for t in REACTION_TYPES}
+        expected["reaction_count"] = sum(expected.values())
+        expected[child_column] = children.get(row.id, 0)
+        if any(getattr(row, col) != value for col, value in expected.items()):
+            # Moved in the same UPDATE, so the target's reaction ETag changes with its counts
+            expected["reaction_version"] = model.reaction_version + 1
+            db.session.execute(update(model).where(model.id == row.id).values(expected))
+            repaired.append(row)
+    return repaired
+
+
+def reconcile_counters(batch_size=1000):
+    """Recompute post and comment counters from the raw reactions and
+    comments tables, one id range per transaction.
+
+    Repaired targets get a new reaction_version; repaired posts drop their
+    cached feed pages and repaired comments mark their post's comment tree
+    as changed. Returns the number of posts and comments whose counters
+    were repaired.
+    """
+    counter_columns = [f"{t}_count" for t in REACTION_TYPES] + ["reaction_count"]
+    result = {"posts": 0, "comments": 0}
+
+    for model, key, child_column in ((Post, "posts", "comment_count"), (Comment, "comments", "reply_count")):
+        columns = [model.id] + [getattr(model, c) for c in counter_columns + [child_column]]
+        columns.append(Post.category if model is Post else Comment.post_id)
+        last_id = 0
+        while True:
+            rows = db.session.query(*columns).filter(model.id > last_id)\
+                .order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+            ids = [r.id for r in rows]
+            last_id = ids[-1]
+
+            if model is Post:
+                reactions = _reaction_tallies(Reaction.post_id, ids, Reaction.comment_id == None)
+                child_q = db.session.query(Comment.post_id, func.count(Comment.id))\
+                    .filter(Comment.post_id.in_(ids), Comment.is_deleted == False)\
+                    .group_by(Comment.post_id)
+            else:
+                reactions = _reaction_tallies(Reaction.comment_id, ids)
+                child_q = db.session.query(Comment.parent_id, func.count(Comment.id))\
+                    .filter(Comment.parent_id.in_(ids), Comment.is_deleted == False)\
+                    .group_by(Comment.parent_id)
+            children = dict(child_q.all())
+
+            repaired = _repair(model, rows, reactions, children, child_column)
+            if model is Comment:
+                for post_id in {r.post_id for r in repaired}:
+                    touch_comment_tree(post_id)
+            db.session.commit()
+            if model is Post:
+                tags = set()
+                for row in repaired:
+                    tags.update(post_tags(row.id, row.category, ranking=True))
+                feed_cache.invalidate(*tags)
+            result[key] += len(repaired)
+    return result
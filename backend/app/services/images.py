@@ -0,0 +1,139 @@
+import math
+import os
+import tempfile
+from PIL import Image, ImageOps
+
+# Runs inside the media worker processes: Pillow only, no app or database
+
+
+def derivative_name(stem, width):
+    return f"{stem}-{width}w.webp"
+
+
+def _save_webp(image, path, quality):
+    # Written aside and renamed so readers never see a partial file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".derivative-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            # No exif/icc arguments: metadata is stripped
+            image.save(out, "WEBP", quality=quality, method=4)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return os.path.getsize(path)
+
+
+def _flatten(image):
+    """RGB copy of the image, transparent areas over white"""
+    if image.mode == "RGBA":
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def dominant_color(image):
+    """Most common colour of a 5-colour quantization, as #rrggbb"""
+    small = _flatten(image)
+    small.thumbnail((64, 64))
+    quantized = small.quantize(colors=5)
+    _, index = max(quantized.getcolors())
+    r, g, b = quantized.getpalette()[index * 3:index * 3 + 3]
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+_BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def _base83(value, length):
+    return "".join(_BASE83[value // 83 ** (length - i - 1) % 83] for i in range(length))
+
+
+_SRGB_TO_LINEAR = [v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4 for v in (c / 255 for c in range(256))]
+
+
+def _linear_to_srgb(value):
+    v = max(0.0, min(1.0, value))
+    return int(v * 12.92 * 255 + 0.5) if v <= 0.0031308 else int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def blurhash(image):
+    """BlurHash (https://blurha.sh) of the image: 4x3 components, 3x4 for
+    portraits, computed on a 32px thumbnail; about 28 characters"""
+    small = _flatten(image)
+    small.thumbnail((32, 32))
+    width, height = small.size
+    x_components, y_components = (3, 4) if height > width else (4, 3)
+    data = [_SRGB_TO_LINEAR[c] for c in small.tobytes()]
+    pixels = list(zip(data[0::3], data[1::3], data[2::3]))
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(x_components)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(y_components)]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                for x in range(width):
+                    basis = cos_x[i][x] * cos_y[j][y]
+                    pr, pg, pb = pixels[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = (1 if i == j == 0 else 2) / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    actual_max = max(abs(c) for factor in ac for c in factor)
+    quantised_max = max(0, min(82, math.floor(actual_max * 166 - 0.5)))
+    max_value = (quantised_max + 1) / 166
+    encoded = _base83(x_components - 1 + (y_components - 1) * 9, 1) + _base83(quantised_max, 1)
+    encoded += _base83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        r, g, b = (
+            max(0, min(18, math.floor(math.copysign(abs(c / max_value) ** 0.5, c) * 9 + 9.5)))
+            for c in factor
+        )
+        encoded += _base83(r * 19 * 19 + g * 19 + b, 2)
+    return encoded
+
+
+def process_image(source, stem, widths, quality):
+    """Everything derived from an uploaded image, in one decode.
+
+    Returns {width, height, dominant_color, blurhash, derivatives}, or None
+    when the file is not a readable image. Dimensions are as displayed,
+    after EXIF orientation is applied to the pixels. `derivatives` are
+    resized WebP copies written next to `source`, narrowest first, as
+    [{width, height, name, size_bytes}]; images are never upscaled, so
+    widths at or past the image's own are replaced by one full-size copy.
+    """
+    directory = os.path.dirname(source)
+    try:
+        with Image.open(source) as original:
+            image = ImageOps.exif_transpose(original)
+            image.load()
+    except (OSError, Image.DecompressionBombError):
+        return None
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+
+    targets = [w for w in sorted(set(widths)) if w < image.width]
+    if max(widths) >= image.width:
+        targets.append(image.width)
+    derivatives = []
+    for width in targets:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.Resampling.LANCZOS)
+        name = derivative_name(stem, width)
+        size_bytes = _save_webp(resized, os.path.join(directory, name), quality)
+        derivatives.append({"width": width, "height": height, "name": name, "size_bytes": size_bytes})
+    return {
+        "width": image.width,
+        "height": image.height,
+        "dominant_color": dominant_color(image),
+        "blurhash": blurhash(image),
+        "derivatives": derivatives,
+    }
@@ -0,0 +1,57 @@
+import os
+import time
+import uuid
+from .local_sqlite import LocalSQLite
+
+
+class LeaderLock:
+    """Expiring lease that elects one process out of all the web workers.
+
+    The lease is a row in a local SQLite file shared by every worker. Its
+    holder keeps it by calling `acquire()` again before `ttl` seconds pass;
+    once it stops (or dies), the next process to call `acquire()` takes
+    over. Holders are told apart by pid, so workers forked from a
+    preloaded app don't share one.
+    """
+
+    def __init__(self, path, name, ttl):
+        self.path = path
+        self.name = name
+        self.ttl = ttl
+        self._pid = None
+        self._holder = None
+        self._expires_at = 0
+        self._sqlite = LocalSQLite(path, schema=[
+            "CREATE TABLE IF NOT EXISTS leaders (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)",
+        ])
+
+    def _holder_id(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._holder = f"{self._pid}-{uuid.uuid4().hex}"
+            self._expires_at = 0
+        return self._holder
+
+    def acquire(self):
+        """Take or renew the lease; True while this process holds it"""
+        holder = self._holder_id()
+        now = time.time()
+        conn = self._sqlite.conn()
+        conn.execute(
+            "INSERT INTO leaders (name, holder, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+            "WHERE leaders.holder = excluded.holder OR leaders.expires_at < ?",
+            (self.name, holder, now + self.ttl, now),
+        )
+        row = conn.execute("SELECT holder, expires_at FROM leaders WHERE name = ?", (self.name,)).fetchone()
+        self._expires_at = row[1] if row and row[0] == holder else 0
+        return self.held()
+
+    def held(self):
+        """Whether this process held the lease at its last renewal and it hasn't run out"""
+        return self._pid == os.getpid() and time.time() < self._expires_at
+
+    def release(self):
+        if self.held():
+            self._sqlite.conn().execute("DELETE FROM leaders WHERE name = ? AND holder = ?", (self.name, self._holder))
+        self._expires_at = 0
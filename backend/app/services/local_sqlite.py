@@ -0,0 +1,37 @@
+import os
+import sqlite3
+import threading
+
+
+class LocalSQLite:
+    """Per-thread connections to a SQLite file on local disk, shared by
+    every worker process on the host.
+
+    Connections are in autocommit mode (callers open `BEGIN IMMEDIATE`
+    where they need a transaction) with WAL journaling, so readers never
+    wait for the writer. `schema` statements run on each new connection
+    and must be idempotent. A connection inherited through fork is never
+    reused; the child opens its own.
+    """
+
+    def __init__(self, path, schema=(), timeout=10):
+        self.path = path
+        self.schema = list(schema)
+        self.timeout = timeout
+        self._pid = None
+        self._local = threading.local()
+
+    def conn(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._local = threading.local()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.schema:
+                conn.execute(statement)
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,195 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from functools import partial
+from .images import process_image
+
+
+def srcset(derivatives):
+    """`srcset` attribute value for a Media row's derivatives, or None"""
+    if not derivatives:
+        return None
+    return ", ".join(f"{d['url']} {d['width']}w" for d in derivatives)
+
+
+class MediaProcessor:
+    """Processes uploaded images off the request path: resized WebP
+    derivatives plus the dimensions, dominant colour and blurhash clients
+    use to lay out and fill placeholders before the image arrives.
+
+    `submit()` hands an image to a pool of MEDIA_WORKERS processes (Pillow
+    work is CPU bound) and returns at once; when it finishes the result is
+    recorded on every Media row serving that file. Only the web worker
+    leading the scheduler keeps a pool: uploads handled by the others, or
+    whose work was lost to a restart, are picked up by its `sweep()` job.
+    With MEDIA_WORKERS at 0 or the scheduler off, `flask process-images`
+    does the work instead.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self._pool = None
+        self._queued = set()
+        self._failed = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get("MEDIA_WORKERS", 2)
+        self.widths = app.config["MEDIA_DERIVATIVE_WIDTHS"]
+        self.quality = app.config.get("MEDIA_WEBP_QUALITY", 80)
+        app.extensions["media_processor"] = self
+
+    def _executor(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    # spawn, not fork: the web process has threads and open connections
+                    self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _job(self, url):
+        """Arguments to process_image for the file behind `url`"""
+        from ..extensions import storage
+
+        key = storage.key_from_url(url)
+        return storage.path(key), os.path.splitext(key.rsplit("/", 1)[-1])[0], self.widths, self.quality
+
+    def submit(self, media):
+        """Queue processing of a committed image Media row"""
+        from ..extensions import scheduler
+
+        if not self.workers or media.type != "image" or not scheduler.is_leader():
+            return False
+        return self._submit(media.url)
+
+    def _submit(self, url):
+        with self._lock:
+            if url in self._queued:
+                return False
+            self._queued.add(url)
+        future = self._executor().submit(process_image, *self._job(url))
+        self.submitted += 1
+        future.add_done_callback(partial(self._done, url))
+        return True
+
+    def _done(self, url, future):
+        with self.app.app_context():
+            try:
+                record_processed(url, future.result())
+                self.completed += 1
+            except Exception:
+                # Left unrecorded and not swept again here; the backfill command retries it
+                self.failed += 1
+                self._failed.add(url)
+                self.app.logger.exception("Processing image %s failed", url)
+            finally:
+                with self._lock:
+                    self._queued.discard(url)
+
+    def sweep(self, batch_size=100):
+        """Queue images still missing derivatives or metadata, e.g. uploaded
+        through another worker; a scheduler job, so it runs on the leader"""
+        from ..extensions import db
+        from ..models.post import Media
+
+        if not self.workers:
+            return 0
+        with self._lock:
+            skip = self._queued | self._failed
+        # An unreadable image is recorded without width or derivatives, so
+        # processed_at, not those columns, tells whether it was tried
+        urls = db.session.query(Media.url).filter(
+            Media.processed_at.is_(None),
+            Media.type == "image",
+            db.or_(Media.derivatives.is_(None), Media.width.is_(None)),
+        ).distinct().limit(batch_size + len(skip))
+        # The uploading worker commits the row before it moves the file into place
+        return sum(
+            self._submit(url) for (url,) in urls
+            if url not in skip and os.path.exists(self._job(url)[0])
+        )
+
+    def backfill(self, workers=None, batch_size=100):
+        """Process every image Media row still missing derivatives or
+        metadata, on all cores unless `workers` says otherwise; returns rows
+        updated"""
+        from ..extensions import db
+        from ..models.post import Media
+
+        context = multiprocessing.get_context("spawn")
+        updated, last_id = 0, 0
+        with ProcessPoolExecutor(workers or os.cpu_count(), mp_context=context) as pool:
+            while True:
+                rows = db.session.query(Media.id, Media.url).filter(
+                    Media.type == "image",
+                    db.or_(Media.derivatives.is_(None), Media.width.is_(None)),
+                    Media.id > last_id,
+                ).order_by(Media.id).limit(batch_size).all()
+                if not rows:
+                    return updated
+                last_id = rows[-1].id
+                urls = list(dict.fromkeys(row.url for row in rows))
+                futures = {pool.submit(process_image, *self._job(url)): url for url in urls}
+                for future in as_completed(futures):
+                    try:
+                        updated += record_processed(futures[future], future.result())
+                    except Exception:
+                        self.app.logger.exception("Processing image %s failed", futures[future])
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+def record_processed(url, result):
+    """Store a process_image result on every Media row serving `url`.
+
+    An unreadable image gets an empty derivative list and no metadata, so
+    uploads keep working without placeholders.
+    """
+    from ..extensions import db, feed_cache
+    from ..models.post import Media
+    from .cache import post_tags
+
+    result = result or {"derivatives": []}
+    base = url.rsplit("/", 1)[0]
+    values = {
+        Media.derivatives: [
+            {"width": d["width"], "height": d["height"], "url": f"{base}/{d['name']}", "size_bytes": d["size_bytes"]}
+            for d in result["derivatives"]
+        ],
+        Media.width: result.get("width"),
+        Media.height: result.get("height"),
+        Media.dominant_color: result.get("dominant_color"),
+        Media.blurhash: result.get("blurhash"),
+        Media.processed_at: datetime.utcnow(),
+    }
+    post_ids = [post_id for (post_id,) in db.session.query(Media.post_id).filter(Media.url == url).distinct()]
+    updated = Media.query.filter(Media.url == url).update(values, synchronize_session=False)
+    db.session.commit()
+    tags = []
+    for post_id in post_ids:
+        tags.extend(post_tags(post_id))
+    if tags:
+        feed_cache.invalidate(*tags)
+    return updated
+
+
+def placeholder(media):
+    """Layout and placeholder fields of a Media row or row tuple, for API output"""
+    return {
+        "width": media.width,
+        "height": media.height,
+        "dominant_color": media.dominant_color,
+        "blurhash": media.blurhash,
+    }
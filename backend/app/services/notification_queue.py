@@ -0,0 +1,177 @@
+import json
+import threading
+import time
+import uuid
+from flask import current_app
+from .local_sqlite import LocalSQLite
+
+
+class NotificationQueue:
+    """Durable local queue of notification events, drained by worker threads.
+
+    Request handlers call `enqueue()` after their own transaction commits;
+    that is one small write to a local SQLite file (WAL, so it survives a
+    crashed worker process). Workers lease a batch of due events, deliver
+    them in one database transaction (services/notifications.py), then
+    delete them. A failed batch is retried with exponential backoff and
+    moved to `dead_events` after NOTIFY_MAX_ATTEMPTS. A lease that expires
+    because its worker died is picked up again, so delivery is at least once.
+
+    Every web process runs NOTIFY_WORKERS threads against the same file; set
+    it to 0 and run `flask notification-worker` to deliver from a separate
+    process instead.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.path = None
+        self.delivered = 0
+        self.retried = 0
+        self._sqlite = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.path = app.config["NOTIFY_QUEUE_PATH"]
+        self.workers = app.config.get("NOTIFY_WORKERS", 2)
+        self.batch_size = app.config.get("NOTIFY_BATCH_SIZE", 200)
+        self.poll_interval = app.config.get("NOTIFY_POLL_INTERVAL_MS", 250) / 1000
+        self.max_attempts = app.config.get("NOTIFY_MAX_ATTEMPTS", 8)
+        self.lease_seconds = app.config.get("NOTIFY_LEASE_SECONDS", 60)
+        self._sqlite = LocalSQLite(self.path, schema=[
+            "CREATE TABLE IF NOT EXISTS events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, enqueued_at REAL NOT NULL, "
+            "available_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, lease TEXT)",
+            "CREATE INDEX IF NOT EXISTS ix_events_available ON events (available_at)",
+            "CREATE TABLE IF NOT EXISTS dead_events ("
+            "id INTEGER PRIMARY KEY, payload TEXT NOT NULL, enqueued_at REAL NOT NULL, "
+            "attempts INTEGER NOT NULL, error TEXT, failed_at REAL NOT NULL)",
+        ])
+        app.extensions["notification_queue"] = self
+        if self.workers:
+            app.before_request(self._start_once)
+
+    def enqueue(self, *events):
+        """Queue notification payloads (dicts) for delivery"""
+        events = [e for e in events if e]
+        if not events:
+            return
+        now = time.time()
+        self._sqlite.conn().executemany(
+            "INSERT INTO events (payload, enqueued_at, available_at) VALUES (?, ?, ?)",
+            [(json.dumps(e, separators=(",", ":")), now, now) for e in events],
+        )
+        self._wake.set()
+
+    def _lease(self):
+        """Claim up to batch_size due events for this caller"""
+        conn = self._sqlite.conn()
+        lease = uuid.uuid4().hex
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE events SET lease = ?, available_at = ? WHERE id IN "
+                "(SELECT id FROM events WHERE available_at <= ? ORDER BY id LIMIT ?)",
+                (lease, now + self.lease_seconds, now, self.batch_size),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return conn.execute(
+            "SELECT id, payload, enqueued_at, attempts FROM events WHERE lease = ? ORDER BY id", (lease,)
+        ).fetchall()
+
+    def process_batch(self):
+        """Deliver one leased batch; returns the number of events handled"""
+        from .notifications import deliver
+
+        rows = self._lease()
+        if not rows:
+            return 0
+        conn = self._sqlite.conn()
+        ids = [(r[0],) for r in rows]
+        try:
+            deliver([json.loads(r[1]) for r in rows])
+        except Exception as e:
+            current_app.logger.warning("Notification delivery failed, will retry", exc_info=True)
+            self._fail(rows, repr(e))
+            return 0
+        conn.executemany("DELETE FROM events WHERE id = ?", ids)
+        self.delivered += len(rows)
+        return len(rows)
+
+    def _fail(self, rows, error):
+        conn = self._sqlite.conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        for event_id, payload, enqueued_at, attempts in rows:
+            attempts += 1
+            if attempts >= self.max_attempts:
+                conn.execute(
+                    "INSERT OR REPLACE INTO dead_events (id, payload, enqueued_at, attempts, error, failed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (event_id, payload, enqueued_at, attempts, error, now),
+                )
+                conn.execute("DELETE FROM events WHERE id = ?", (event_id,))
+            else:
+                conn.execute(
+                    "UPDATE events SET attempts = ?, lease = NULL, available_at = ? WHERE id = ?",
+                    (attempts, now + min(2 ** attempts, 300), event_id),
+                )
+                self.retried += 1
+        conn.execute("COMMIT")
+
+    def drain(self):
+        """Deliver everything that is currently due; returns the count"""
+        total = 0
+        while True:
+            handled = self.process_batch()
+            if not handled:
+                return total
+            total += handled
+
+    def run_worker(self, stop=None):
+        """Worker loop; runs in the caller's thread until `stop` is set"""
+        stop = stop or self._stop
+        while not stop.is_set():
+            with self.app.app_context():
+                try:
+                    handled = self.process_batch()
+                except Exception:
+                    self.app.logger.exception("Notification worker error")
+                    handled = 0
+            if not handled:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _start_once(self):
+        if self._threads:
+            return
+        with self._lock:
+            if not self._threads:
+                for i in range(self.workers):
+                    thread = threading.Thread(target=self.run_worker, name=f"notify-worker-{i}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self):
+        conn = self._sqlite.conn()
+        now = time.time()
+        depth, oldest = conn.execute("SELECT COUNT(*), MIN(enqueued_at) FROM events").fetchone()
+        dead = conn.execute("SELECT COUNT(*) FROM dead_events").fetchone()[0]
+        return {
+            "depth": depth,
+            "lag_seconds": round(now - oldest, 3) if oldest else 0,
+            "dead": dead,
+            "delivered": self.delivered,
+            "retried": self.retried,
+        }
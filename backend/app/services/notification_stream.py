@@ -0,0 +1,146 @@
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from .pagination import encode_cursor
+
+# Pushed to a subscriber whose queue overflowed: the stream ends and the
+# client reconnects with Last-Event-ID to catch up from the database
+RECONNECT = None
+
+
+class NotificationBroker:
+    """Fans new notifications out to the SSE connections of this process.
+
+    One thread polls the notifications table every SSE_POLL_INTERVAL_MS for
+    rows (re)delivered to any connected user, however many connections are
+    open, and drops them on each connection's queue. Rows are followed by
+    `delivered_at`, re-reading a short overlap each time so a transaction
+    that committed late is still seen; already-sent rows are skipped.
+
+    Each poll also re-reads the connected users' unread counters and pushes
+    any that changed, so marking notifications read in another process
+    reaches these streams too; the read routes push their own process's
+    streams directly with `publish_unread`.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._subscribers = {}
+        self._seen = {}
+        self._unread = {}
+        self._since = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get("SSE_POLL_INTERVAL_MS", 1000) / 1000
+        self.overlap = timedelta(seconds=app.config.get("SSE_POLL_OVERLAP_SECONDS", 5))
+        self.queue_size = app.config.get("SSE_QUEUE_SIZE", 100)
+        app.extensions["notification_broker"] = self
+
+    def subscribe(self, user_id):
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(q)
+        self._start_once()
+        return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            queues = self._subscribers.get(user_id)
+            if queues is not None:
+                queues.discard(q)
+                if not queues:
+                    del self._subscribers[user_id]
+                    self._unread.pop(user_id, None)
+
+    def connections(self):
+        with self._lock:
+            return sum(len(queues) for queues in self._subscribers.values())
+
+    def _publish(self, user_id, event):
+        with self._lock:
+            queues = list(self._subscribers.get(user_id, ()))
+        for q in queues:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                with q.mutex:
+                    q.queue.clear()
+                q.put_nowait(RECONNECT)
+
+    def publish_unread(self, user_id, count):
+        """Push a user's unread count to their streams unless they already have it"""
+        with self._lock:
+            if user_id not in self._subscribers or self._unread.get(user_id) == count:
+                return
+            self._unread[user_id] = count
+        self._publish(user_id, ("unread", None, {"count": count}))
+
+    def _start_once(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="notification-broker", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                users = list(self._subscribers)
+            if not users:
+                self._since = None
+                continue
+            with self.app.app_context():
+                try:
+                    self.poll(users)
+                except Exception:
+                    self.app.logger.exception("Notification stream poll failed")
+
+    def poll(self, users):
+        from ..extensions import db
+        from ..models.notification import Notification, UnreadCounter
+        from .notifications import serialize_notifications
+
+        now = datetime.utcnow()
+        since = (self._since or now) - self.overlap
+        self._since = now
+        fresh = []
+        for i in range(0, len(users), 500):
+            rows = Notification.query.filter(
+                Notification.delivered_at >= since,
+                Notification.user_id.in_(users[i:i + 500]),
+            ).order_by(Notification.delivered_at, Notification.id).all()
+            fresh.extend(n for n in rows if (n.id, n.delivered_at) not in self._seen)
+        for key, seen_at in list(self._seen.items()):
+            if seen_at < since:
+                del self._seen[key]
+
+        for n in fresh:
+            self._seen[(n.id, n.delivered_at)] = n.delivered_at
+        for n, payload in zip(fresh, serialize_notifications(fresh)):
+            self._publish(n.user_id, ("notification", event_id(n), payload))
+        for i in range(0, len(users), 500):
+            unread = db.session.query(UnreadCounter.user_id, UnreadCounter.unread)\
+                .filter(UnreadCounter.user_id.in_(users[i:i + 500]))
+            for user_id, count in unread:
+                self.publish_unread(user_id, count)
+        return len(fresh)
+
+def event_id(notification):
+    """SSE id of a notification; sent back as Last-Event-ID to resume"""
+    return encode_cursor(notification.delivered_at, notification.id)
+
+
+def format_event(kind, id_, data):
+    """One Server-Sent Events frame"""
+    lines = [f"event: {kind}"]
+    if id_:
+        lines.append(f"id: {id_}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,228 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import bindparam, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from ..extensions import db, user_cards
+from ..models.notification import Notification, NotificationActor, UnreadCounter
+from .schema import insert_ignore
+
+# Notification types folded into one row per (recipient, type, target) while
+# the row saw activity within NOTIFY_COALESCE_WINDOW_HOURS, and the phrase
+# used once more than one actor is involved
+COALESCED_TYPES = {
+    "post_reaction": "reacted to your post",
+    "comment_reaction": "reacted to your comment",
+}
+
+
+def notification_event(recipient_id, actor_id, actor_name, type_, content, post_id=None, comment_id=None):
+    """Payload for the notification queue, or None for self-notifications"""
+    if recipient_id is None or recipient_id == actor_id:
+        return None
+    return {
+        "user_id": recipient_id,
+        "actor_id": actor_id,
+        "actor_name": actor_name,
+        "type": type_,
+        "content": content,
+        "post_id": post_id,
+        "comment_id": comment_id,
+        # Stamped when the action happened, not when a worker got to it
+        "created_at": datetime.utcnow().isoformat(),
+    }
+
+
+def serialize_notifications(notifications):
+    """API representation of notification rows, with the latest and recent
+    actors of every row resolved in one batched lookup"""
+    actor_ids = set()
+    for n in notifications:
+        actor_ids.add(n.actor_id)
+        actor_ids.update(n.recent_actor_ids or [])
+    actors = user_cards.get_many(actor_ids)
+
+    return [
+        {
+            "id": n.id,
+            "type": n.type,
+            "content": n.content,
+            "post_id": n.post_id,
+            "comment_id": n.comment_id,
+            "actor_name": actors[n.actor_id]["name"],
+            "actor_id": n.actor_id,
+            "actor_count": n.actor_count or 1,
+            "recent_actors": [actors[a] for a in (n.recent_actor_ids or [n.actor_id])],
+            "is_read": n.is_read,
+            "created_at": n.created_at.isoformat(),
+        }
+        for n in notifications
+    ]
+
+
+def _key(event):
+    return event["user_id"], event["type"], event["post_id"], event["comment_id"]
+
+
+def coalesce_key(key):
+    """Value of Notification.coalesce_key for a (recipient, type, post, comment) key"""
+    user_id, type_, post_id, comment_id = key
+    return f"{user_id}:{type_}:{post_id or ''}:{comment_id or ''}"
+
+
+def _open_aggregates(keys, cutoff):
+    """Open aggregate per key, if it is still inside the window"""
+    if not keys:
+        return {}
+    rows = Notification.query.filter(
+        Notification.coalesce_key.in_([coalesce_key(k) for k in keys]),
+        Notification.created_at >= cutoff,
+    )
+    return {(n.user_id, n.type, n.post_id, n.comment_id): n for n in rows}
+
+
+def _add_actor(notification, actor_id):
+    """Record `actor_id` on the aggregate; True if they hadn't acted on it yet"""
+    return insert_ignore(NotificationActor, {"notification_id": notification.id, "actor_id": actor_id}) is not None
+
+
+def _merge(notification, event, keep):
+    recent = notification.recent_actor_ids or [notification.actor_id]
+    others = [a for a in recent if a != event["actor_id"]]
+    if _add_actor(notification, event["actor_id"]):
+        notification.actor_count = (notification.actor_count or 1) + 1
+    notification.recent_actor_ids = ([event["actor_id"]] + others)[:keep]
+    notification.actor_id = event["actor_id"]
+    notification.created_at = event["created_at"]
+    notification.is_read = False
+    if notification.actor_count > 1:
+        others_count = notification.actor_count - 1
+        notification.content = (
+            f"{event.get('actor_name') or 'Someone'} and {others_count} other{'s' if others_count > 1 else ''} "
+            f"{COALESCED_TYPES[event['type']]}"
+        )
+    else:
+        notification.content = event["content"]
+
+
+def deliver(events):
+    """Write a batch of queued notification events in one transaction.
+
+    Reaction events update the recipient's open aggregate for that target
+    (bumping it to the top and marking it unread) instead of adding a row.
+    """
+    config = current_app.config
+    window = config["NOTIFY_COALESCE_WINDOW_HOURS"]
+    keep = config["NOTIFY_RECENT_ACTORS"]
+    rows, grouped, unread = [], {}, {}
+    for event in events:
+        event = {**event, "created_at": datetime.fromisoformat(event["created_at"])}
+        if window and event["type"] in COALESCED_TYPES:
+            grouped.setdefault(_key(event), []).append(event)
+        else:
+            rows.append(event)
+
+    delivered_at = datetime.utcnow()
+    try:
+        cutoff = datetime.utcnow() - timedelta(hours=window)
+        aggregates = _open_aggregates(set(grouped), cutoff)
+        opening = [coalesce_key(key) for key in grouped if key not in aggregates]
+        if opening:
+            # Closed aggregates give their key up to the rows replacing them
+            db.session.execute(
+                update(Notification).where(Notification.coalesce_key.in_(opening), Notification.created_at < cutoff)
+                .values(coalesce_key=None)
+            )
+        for key, group in grouped.items():
+            notification = aggregates.get(key)
+            if notification is None:
+                first = group.pop(0)
+                notification = Notification(
+                    user_id=first["user_id"],
+                    type=first["type"],
+                    content=first["content"],
+                    post_id=first["post_id"],
+                    comment_id=first["comment_id"],
+                    actor_id=first["actor_id"],
+                    actor_count=1,
+                    recent_actor_ids=[first["actor_id"]],
+                    coalesce_key=coalesce_key(key),
+                    created_at=first["created_at"],
+                    delivered_at=delivered_at,
+                    is_read=False,
+                )
+                db.session.add(notification)
+                # A worker opening the same aggregate concurrently makes this
+                # flush fail; the batch is retried and then merges into its row
+                db.session.flush()
+                _add_actor(notification, first["actor_id"])
+                unread[first["user_id"]] = unread.get(first["user_id"], 0) + 1
+            for event in group:
+                if notification.is_read:
+                    unread[event["user_id"]] = unread.get(event["user_id"], 0) + 1
+                _merge(notification, event, keep)
+            notification.delivered_at = delivered_at
+        if rows:
+            db.session.execute(insert(Notification), [
+                {
+                    **{k: v for k, v in event.items() if k != "actor_name"},
+                    "is_read": False,
+                    "delivered_at": delivered_at,
+                    "actor_count": 1,
+                    "recent_actor_ids": [event["actor_id"]],
+                }
+                for event in rows
+            ])
+            for event in rows:
+                unread[event["user_id"]] = unread.get(event["user_id"], 0) + 1
+        bump_unread(unread)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def bump_unread(deltas):
+    """Apply {user_id: delta} to the unread counters in the caller's transaction.
+
+    Only existing counters move; a user without one gets it built by a
+    full recount on their next read.
+    """
+    deltas = {user_id: d for user_id, d in deltas.items() if d}
+    if not deltas:
+        return
+    stmt = update(UnreadCounter).where(UnreadCounter.user_id == bindparam("uid"))\
+        .values(unread=UnreadCounter.unread + bindparam("delta"))\
+        .execution_options(synchronize_session=False)
+    db.session.connection().execute(stmt, [{"uid": u, "delta": d} for u, d in deltas.items()])
+
+
+def reset_unread(user_id):
+    """Zero the user's unread counter in the caller's transaction"""
+    db.session.execute(update(UnreadCounter).where(UnreadCounter.user_id == user_id).values(unread=0))
+
+
+def recount_unread(user_id):
+    """Rebuild the user's unread counter from the notifications table"""
+    counted = select(func.count(Notification.id))\
+        .where(Notification.user_id == user_id, Notification.is_read == False)
+    result = db.session.execute(
+        update(UnreadCounter).where(UnreadCounter.user_id == user_id).values(unread=counted.scalar_subquery())
+    )
+    if result.rowcount == 0:
+        try:
+            db.session.execute(insert(UnreadCounter).from_select(
+                ["user_id", "unread"], counted.with_only_columns(literal(user_id), func.count(Notification.id)),
+            ))
+        except IntegrityError:
+            # A concurrent reader created it first; that count is as fresh
+            db.session.rollback()
+    db.session.commit()
+    return db.session.query(UnreadCounter.unread).filter(UnreadCounter.user_id == user_id).scalar()
+
+
+def unread_count(user_id):
+    """The user's unread notification count, recounted if missing or negative"""
+    unread = db.session.query(UnreadCounter.unread).filter(UnreadCounter.user_id == user_id).scalar()
+    if unread is None or unread < 0:
+        return recount_unread(user_id)
+    return unread
@@ -0,0 +1,51 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*values):
+    """Pack sort-key values into an opaque, URL-safe cursor string"""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, kinds):
+    """Unpack a cursor produced by encode_cursor.
+
+    `kinds` lists the expected type of each value (datetime, int, float) so a
+    tampered or stale cursor is rejected instead of reaching the query.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Malformed cursor") from e
+    if not isinstance(payload, list) or len(payload) != len(kinds):
+        raise InvalidCursor("Malformed cursor")
+    values = []
+    try:
+        for kind, value in zip(kinds, payload):
+            if kind is datetime:
+                values.append(datetime.fromisoformat(value))
+            else:
+                values.append(kind(value))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Malformed cursor") from e
+    return values
+
+
+def keyset_filter(columns, values, descending=True):
+    """Row-value comparison `(c1, c2, ...) < (v1, v2, ...)` spelled out with
+    AND/OR so it works on SQLite and MySQL and stays index-friendly."""
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        step = column < value if descending else column > value
+        prefix = [c == v for c, v in zip(columns[:i], values[:i])]
+        clauses.append(and_(*prefix, step) if prefix else step)
+    return or_(*clauses)
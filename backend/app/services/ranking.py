@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import bindparam, update
+from ..extensions import db, feed_cache
+from ..models.post import Post
+
+
+def hot_score(reactions, comments, created_at, now=None):
+    """Time-decayed engagement score, higher is hotter.
+
+    (base + w_r * reactions + w_c * comments) / (age_hours + 2) ** gravity,
+    with the weights and gravity taken from Config.
+    """
+    config = current_app.config
+    now = now or datetime.utcnow()
+    age_hours = max((now - created_at).total_seconds() / 3600, 0)
+    engagement = (
+        config["HOT_BASE_SCORE"]
+        + config["HOT_REACTION_WEIGHT"] * (reactions or 0)
+        + config["HOT_COMMENT_WEIGHT"] * (comments or 0)
+    )
+    return engagement / (age_hours + 2) ** config["HOT_GRAVITY"]
+
+
+def refresh_hot_score(post_id):
+    """Recompute one post's score from its counters, in the caller's transaction"""
+    row = db.session.query(Post.reaction_count, Post.comment_count, Post.created_at)\
+        .filter(Post.id == post_id).first()
+    if row is None or row.created_at is None:
+        return
+    score = hot_score(row.reaction_count, row.comment_count, row.created_at)
+    db.session.execute(update(Post).where(Post.id == post_id).values(hot_score=score))
+
+
+def redecay_hot_scores(batch_size=500):
+    """Re-apply time decay to every post inside the hot window.
+
+    Posts that age out of the window are zeroed once so they sink below
+    everything still trending. Returns the number of posts rescored.
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(days=current_app.config["HOT_WINDOW_DAYS"])
+    stmt = update(Post).where(Post.id == bindparam("pid")).values(hot_score=bindparam("score"))\
+        .execution_options(synchronize_session=False)
+
+    rescored = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(Post.id, Post.reaction_count, Post.comment_count, Post.created_at)\
+            .filter(Post.id > last_id, Post.created_at >= cutoff, Post.is_deleted == False)\
+            .order_by(Post.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        params = [
+            {"pid": r.id, "score": hot_score(r.reaction_count, r.comment_count, r.created_at, now)}
+            for r in rows
+        ]
+        db.session.connection().execute(stmt, params)
+        db.session.commit()
+        rescored += len(rows)
+
+    db.session.execute(
+        update(Post).where(Post.created_at < cutoff, Post.hot_score != 0).values(hot_score=0)
+    )
+    db.session.commit()
+    feed_cache.invalidate("hot")
+    return rescored
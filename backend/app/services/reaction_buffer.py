@@ -0,0 +1,198 @@
+import atexit
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from .local_sqlite import LocalSQLite
+
+
+class ReactionBuffer:
+    """Write-behind buffer for reaction toggles.
+
+    Requests only record the desired final state per (user, target, type),
+    so an add followed by a remove before the next flush costs nothing. A
+    daemon thread applies everything pending in one transaction every
+    REACTION_FLUSH_INTERVAL_MS, or sooner once REACTION_FLUSH_MAX_OPS are
+    waiting; an atexit hook flushes what is left on graceful shutdown.
+
+    Pending toggles live in a local SQLite file (REACTION_BUFFER_PATH) shared
+    by every web process, so reads overlay the caller's unflushed toggles
+    (see `pending_for`) whichever worker serves them. Flushers in different
+    processes lease disjoint batches; a toggle changed while its batch is
+    being applied is kept for the next flush, and a lease left by a dead
+    process is picked up again after LEASE_SECONDS.
+    """
+
+    LEASE_SECONDS = 60
+
+    def __init__(self):
+        self.app = None
+        self.path = None
+        self.enabled = False
+        self.flushed = 0
+        self.failed = 0
+        self._sqlite = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("REACTION_WRITE_BEHIND", False)
+        self.path = app.config["REACTION_BUFFER_PATH"]
+        self._sqlite = LocalSQLite(self.path, schema=[
+            "CREATE TABLE IF NOT EXISTS toggles ("
+            "key TEXT PRIMARY KEY, user_id INTEGER NOT NULL, post_id INTEGER, comment_id INTEGER, "
+            "type TEXT NOT NULL, present INTEGER NOT NULL, actor_name TEXT, lease TEXT, leased_at REAL)",
+            "CREATE INDEX IF NOT EXISTS ix_toggles_user ON toggles (user_id)",
+        ])
+        self.interval = app.config.get("REACTION_FLUSH_INTERVAL_MS", 200) / 1000
+        self.max_ops = app.config.get("REACTION_FLUSH_MAX_OPS", 500)
+        app.extensions["reaction_buffer"] = self
+        if self.enabled:
+            atexit.register(self.flush)
+
+    @staticmethod
+    def _key(user_id, post_id, comment_id, type_):
+        return (user_id, None, comment_id, type_) if comment_id else (user_id, post_id, None, type_)
+
+    def enqueue(self, actor, post_id, comment_id, type_, present):
+        """Record that `actor`'s reaction should exist (present=True) or not"""
+        key = self._key(actor.id, post_id, comment_id, type_)
+        conn = self._sqlite.conn()
+        # Clearing the lease keeps a toggle changed mid-flush for the next one
+        conn.execute(
+            "INSERT INTO toggles (key, user_id, post_id, comment_id, type, present, actor_name) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+            "present = excluded.present, actor_name = excluded.actor_name, lease = NULL, leased_at = NULL",
+            ("%s:%s:%s:%s" % key, *key, int(present), actor.name),
+        )
+        backlog = conn.execute("SELECT COUNT(*) FROM toggles WHERE lease IS NULL").fetchone()[0]
+        self._start_once()
+        if backlog >= self.max_ops:
+            self._wake.set()
+
+    def pending_for(self, user_id, post_id=None, comment_id=None):
+        """{type: present} for the user's unflushed toggles on one target"""
+        _, post_id, comment_id, _ = self._key(user_id, post_id, comment_id, None)
+        # Leased toggles are being flushed and aren't committed yet either
+        rows = self._sqlite.conn().execute(
+            "SELECT type, present FROM toggles WHERE user_id = ? AND post_id IS ? AND comment_id IS ?",
+            (user_id, post_id, comment_id),
+        ).fetchall()
+        return {type_: bool(present) for type_, present in rows}
+
+    def overlay(self, user_id, counts, user_reactions, post_id=None, comment_id=None):
+        """Apply the user's unflushed toggles to a reaction summary in place"""
+        for type_, present in self.pending_for(user_id, post_id, comment_id).items():
+            if present and type_ not in user_reactions:
+                user_reactions.append(type_)
+                counts[type_] = counts.get(type_, 0) + 1
+            elif not present and type_ in user_reactions:
+                user_reactions.remove(type_)
+                counts[type_] = counts.get(type_, 0) - 1
+                if counts[type_] <= 0:
+                    del counts[type_]
+
+    def _start_once(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="reaction-buffer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception("Reaction flush failed")
+
+    def _lease(self):
+        """Claim every unleased (or abandoned) toggle for this caller"""
+        conn = self._sqlite.conn()
+        lease = uuid.uuid4().hex
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE toggles SET lease = ?, leased_at = ? WHERE lease IS NULL OR leased_at < ?",
+                (lease, now, now - self.LEASE_SECONDS),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        rows = conn.execute(
+            "SELECT user_id, post_id, comment_id, type, present, actor_name FROM toggles "
+            "WHERE lease = ? ORDER BY rowid",
+            (lease,),
+        ).fetchall()
+        return lease, OrderedDict((tuple(r[:4]), (bool(r[4]), r[5])) for r in rows)
+
+    def flush(self):
+        """Apply every pending toggle in one transaction; returns the count"""
+        if not self.enabled:
+            return 0
+        with self._flush_lock:
+            lease, batch = self._lease()
+            if not batch:
+                return 0
+            with self.app.app_context():
+                applied = self._apply(batch)
+            # Only now, once committed, may reads stop overlaying them
+            self._sqlite.conn().execute("DELETE FROM toggles WHERE lease = ?", (lease,))
+            return applied
+
+    def _apply(self, batch):
+        from ..extensions import db, notification_queue
+        from .counters import invalidate_ranking
+        from . import reactions
+
+        def apply_one(key, present, actor_name):
+            user_id, post_id, comment_id, type_ = key
+            event = None
+            if present:
+                post_id, created, event = reactions.apply_add(user_id, actor_name, post_id, comment_id, type_)
+                changed = created is not None
+            else:
+                changed = reactions.apply_remove(user_id, post_id, comment_id, type_)
+            events.append(event)
+            return post_id if changed and not comment_id else None
+
+        ranked = set()
+        events = []
+        failed = 0
+        try:
+            for key, (present, actor_name) in batch.items():
+                ranked.add(apply_one(key, present, actor_name))
+            db.session.commit()
+            notification_queue.enqueue(*events)
+        except Exception:
+            # One bad toggle (e.g. its target was deleted meanwhile) must not
+            # sink the rest: retry them one transaction each
+            db.session.rollback()
+            ranked = set()
+            for key, (present, actor_name) in batch.items():
+                events = []
+                try:
+                    ranked.add(apply_one(key, present, actor_name))
+                    db.session.commit()
+                    notification_queue.enqueue(*events)
+                except Exception:
+                    db.session.rollback()
+                    failed += 1
+                    self.app.logger.warning("Dropped buffered reaction %s", key, exc_info=True)
+        for post_id in ranked - {None}:
+            invalidate_ranking(post_id)
+        self.flushed += len(batch) - failed
+        self.failed += failed
+        return len(batch) - failed
+
+    def stats(self):
+        pending = self._sqlite.conn().execute("SELECT COUNT(*) FROM toggles").fetchone()[0] if self.enabled else 0
+        return {"enabled": self.enabled, "pending": pending, "flushed": self.flushed, "failed": self.failed}
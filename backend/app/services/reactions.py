@@ -0,0 +1,177 @@
+from sqlalchemy import DDL, delete, event, func, select, text
+from ..extensions import db, notification_queue
+from ..models.comment import Comment
+from ..models.post import Post
+from ..models.reaction import Reaction
+from .counters import bump_reaction
+from .notifications import notification_event
+from .schema import has_index, insert_ignore, probe
+
+# uniq_reaction spans the nullable post_id/comment_id, and NULLs never
+# compare equal in a unique index, so it can't stop a duplicate reaction on
+# its own. These indexes key each reaction by its real target instead:
+# partial indexes on SQLite, functional key parts on MySQL (8.0.13+).
+SQLITE_REACTION_INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS uniq_post_reaction "
+    "ON reactions (post_id, user_id, type) WHERE comment_id IS NULL",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uniq_comment_reaction "
+    "ON reactions (comment_id, user_id, type) WHERE comment_id IS NOT NULL",
+]
+MYSQL_REACTION_INDEX = (
+    "CREATE UNIQUE INDEX uniq_reaction_target ON reactions "
+    "(user_id, type, (IFNULL(comment_id, 0)), (IF(comment_id IS NULL, post_id, 0)))"
+)
+REACTION_INDEX_NAMES = {
+    "sqlite": ["uniq_post_reaction", "uniq_comment_reaction"],
+    "mysql": ["uniq_reaction_target"],
+}
+
+for statement in SQLITE_REACTION_INDEXES:
+    event.listen(Reaction.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Reaction.__table__, "after_create", DDL(MYSQL_REACTION_INDEX).execute_if(dialect="mysql"))
+
+
+class TargetNotFound(LookupError):
+    pass
+
+
+def reaction_indexes_ready():
+    """Whether the target unique indexes exist; databases created before
+    them get them from `flask upgrade-schema`"""
+    names = REACTION_INDEX_NAMES.get(db.engine.dialect.name)
+    if not names:
+        return False
+    return probe("reaction_indexes", lambda: all(has_index("reactions", name) for name in names))
+
+
+def dedupe_reactions():
+    """Delete all but the oldest of every duplicated reaction; returns the count"""
+    removed = 0
+    for target_filter, target in (
+        (Reaction.comment_id == None, Reaction.post_id),
+        (Reaction.comment_id != None, Reaction.comment_id),
+    ):
+        # Wrapped in a derived table so MySQL accepts a subquery on the table being deleted from
+        keep = select(func.min(Reaction.id).label("id")).where(target_filter)\
+            .group_by(target, Reaction.user_id, Reaction.type).subquery()
+        result = db.session.execute(
+            delete(Reaction).where(target_filter, Reaction.id.not_in(select(keep.c.id)))
+            .execution_options(synchronize_session=False)
+        )
+        removed += result.rowcount
+    db.session.commit()
+    return removed
+
+
+def ensure_reaction_indexes():
+    """De-duplicate reactions and create the target unique indexes if they
+    are missing. Returns the number of duplicates removed; counters must be
+    reconciled afterwards."""
+    dialect = db.engine.dialect.name
+    if dialect not in REACTION_INDEX_NAMES or all(has_index("reactions", n) for n in REACTION_INDEX_NAMES[dialect]):
+        return 0
+    removed = dedupe_reactions()
+    if dialect == "sqlite":
+        for statement in SQLITE_REACTION_INDEXES:
+            db.session.execute(text(statement))
+    else:
+        db.session.execute(text(MYSQL_REACTION_INDEX))
+    db.session.commit()
+    return removed
+
+
+def _target(post_id, comment_id):
+    """(post_id, comment_id, author_id) of the reaction target"""
+    if comment_id:
+        row = db.session.query(Comment.post_id, Comment.user_id).filter(Comment.id == comment_id).first()
+        if row is None:
+            raise TargetNotFound("Comment not found")
+        return row.post_id, comment_id, row.user_id
+    row = db.session.query(Post.user_id).filter(Post.id == post_id).first()
+    if row is None:
+        raise TargetNotFound("Post not found")
+    return post_id, None, row.user_id
+
+
+def _target_filter(post_id, comment_id):
+    if comment_id:
+        return Reaction.comment_id == comment_id
+    return (Reaction.post_id == post_id) & (Reaction.comment_id == None)
+
+
+def apply_add(actor_id, actor_name, post_id, comment_id, type_):
+    """Insert the reaction and bump counters, without committing.
+
+    Returns (post_id, reaction_id, event): reaction_id is None when the
+    reaction already existed and nothing was written; event is the author's
+    notification to enqueue once the transaction commits, if any.
+    """
+    post_id, comment_id, author_id = _target(post_id, comment_id)
+    if not reaction_indexes_ready():
+        # Without the indexes insert-or-ignore would accept a duplicate
+        existing = db.session.query(Reaction.id)\
+            .filter(_target_filter(post_id, comment_id), Reaction.user_id == actor_id, Reaction.type == type_)\
+            .first()
+        if existing is not None:
+            return post_id, None, None
+    reaction_id = insert_ignore(Reaction, {
+        "post_id": post_id,
+        "comment_id": comment_id,
+        "user_id": actor_id,
+        "type": type_,
+    })
+    if reaction_id is None:
+        return post_id, None, None
+
+    bump_reaction(post_id, comment_id, type_, 1)
+    target = "comment" if comment_id else "post"
+    event = notification_event(
+        author_id, actor_id, actor_name, f"{target}_reaction", f"{actor_name} reacted {type_} to your {target}",
+        post_id=post_id, comment_id=comment_id,
+    )
+    return post_id, reaction_id, event
+
+
+def apply_remove(actor_id, post_id, comment_id, type_):
+    """Delete the reaction and adjust counters, without committing.
+    Returns False when there was no such reaction."""
+    result = db.session.execute(
+        delete(Reaction)
+        .where(_target_filter(post_id, comment_id), Reaction.user_id == actor_id, Reaction.type == type_)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        return False
+    bump_reaction(post_id, comment_id, type_, -1)
+    return True
+
+
+def add_reaction(actor, post_id, comment_id, type_):
+    """Record `actor`'s reaction and its counters in one transaction, then
+    queue the author's notification.
+
+    Returns (reaction_id, created); created is False when the reaction
+    already existed, in which case nothing is written.
+    """
+    post_id, reaction_id, event = apply_add(actor.id, actor.name, post_id, comment_id, type_)
+    if reaction_id is None:
+        db.session.rollback()
+        existing = db.session.query(Reaction.id)\
+            .filter(_target_filter(post_id, comment_id), Reaction.user_id == actor.id, Reaction.type == type_)\
+            .scalar()
+        return existing, False
+    db.session.commit()
+    notification_queue.enqueue(event)
+    return reaction_id, True
+
+
+def remove_reaction(actor, post_id, comment_id, type_):
+    """Delete `actor`'s reaction and adjust the counters in one transaction.
+
+    Returns False when there was no such reaction.
+    """
+    if not apply_remove(actor.id, post_id, comment_id, type_):
+        db.session.rollback()
+        return False
+    db.session.commit()
+    return True
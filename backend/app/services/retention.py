@@ -0,0 +1,84 @@
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from ..extensions import db
+from ..models.notification import Notification
+from .notifications import bump_unread
+from .pagination import keyset_filter
+
+
+def _delete_in_batches(query, batch_size, pause):
+    """Delete the rows matched by `query` a batch per transaction.
+
+    Short transactions with a pause between them keep SQLite's write lock
+    free for foreground requests. Unread rows are taken off their owners'
+    unread counters in the same transaction.
+    """
+    deleted = 0
+    while True:
+        rows = query.with_entities(Notification.id, Notification.user_id, Notification.is_read)\
+            .limit(batch_size).all()
+        if not rows:
+            return deleted
+        Notification.query.filter(Notification.id.in_([r.id for r in rows]))\
+            .delete(synchronize_session=False)
+        unread = Counter(r.user_id for r in rows if not r.is_read)
+        bump_unread({user_id: -n for user_id, n in unread.items()})
+        db.session.commit()
+        deleted += len(rows)
+        if len(rows) < batch_size:
+            return deleted
+        time.sleep(pause)
+
+
+def prune_notifications(batch_size=500):
+    """Apply the notification retention policies from Config.
+
+    - read notifications older than NOTIFY_RETENTION_READ_DAYS
+    - any notification older than NOTIFY_RETENTION_MAX_AGE_DAYS
+    - anything beyond the newest NOTIFY_RETENTION_MAX_PER_USER per user
+
+    A policy set to 0 is skipped. Returns rows removed per policy and the
+    time taken.
+    """
+    config = current_app.config
+    pause = config["NOTIFY_RETENTION_PAUSE_MS"] / 1000
+    started = time.monotonic()
+    now = datetime.utcnow()
+    result = {"read_expired": 0, "expired": 0, "over_cap": 0}
+
+    if config["NOTIFY_RETENTION_READ_DAYS"]:
+        cutoff = now - timedelta(days=config["NOTIFY_RETENTION_READ_DAYS"])
+        result["read_expired"] = _delete_in_batches(
+            Notification.query.filter(Notification.is_read == True, Notification.created_at < cutoff),
+            batch_size, pause,
+        )
+
+    if config["NOTIFY_RETENTION_MAX_AGE_DAYS"]:
+        cutoff = now - timedelta(days=config["NOTIFY_RETENTION_MAX_AGE_DAYS"])
+        result["expired"] = _delete_in_batches(
+            Notification.query.filter(Notification.created_at < cutoff),
+            batch_size, pause,
+        )
+
+    cap = config["NOTIFY_RETENTION_MAX_PER_USER"]
+    if cap:
+        over = db.session.query(Notification.user_id)\
+            .group_by(Notification.user_id).having(func.count(Notification.id) > cap).all()
+        for (user_id,) in over:
+            # The oldest row still kept; everything older goes
+            keep_last = db.session.query(Notification.created_at, Notification.id)\
+                .filter(Notification.user_id == user_id)\
+                .order_by(Notification.created_at.desc(), Notification.id.desc())\
+                .offset(cap - 1).first()
+            older = Notification.query.filter(
+                Notification.user_id == user_id,
+                keyset_filter([Notification.created_at, Notification.id], list(keep_last)),
+            )
+            result["over_cap"] += _delete_in_batches(older, batch_size, pause)
+
+    result["seconds"] = round(time.monotonic() - started, 3)
+    current_app.logger.info("Notification retention: %s", result)
+    return result
@@ -0,0 +1,80 @@
+import threading
+import time
+from flask import current_app
+from .leader import LeaderLock
+
+
+class Scheduler:
+    """Minimal in-process interval scheduler for housekeeping jobs.
+
+    Jobs run on one daemon thread, each inside its own app context. The thread
+    starts on the first request rather than in create_app, so the debug
+    reloader's parent process and CLI commands never run jobs.
+
+    Every web worker starts the thread, but only the one holding the
+    "scheduler" lease (services/leader.py, kept in the NOTIFY_QUEUE_PATH
+    file) runs jobs; the lease is renewed every tick and before each job,
+    and another worker takes over within SCHEDULER_LEASE_SECONDS of the
+    leader going away.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.leader = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def init_app(self, app):
+        app.extensions["scheduler"] = self
+        self.leader = LeaderLock(app.config["NOTIFY_QUEUE_PATH"], "scheduler", app.config.get("SCHEDULER_LEASE_SECONDS", 60))
+        if app.config.get("SCHEDULER_ENABLED", True):
+            app.before_request(self._start_once)
+
+    def add_job(self, name, interval_key, func):
+        """Run `func()` every `app.config[interval_key]` seconds"""
+        self.jobs[name] = {"interval_key": interval_key, "func": func, "next_run": 0}
+
+    def is_leader(self):
+        """Whether this process is the one running jobs"""
+        return self.leader is not None and self.leader.held()
+
+    def _start_once(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                app = current_app._get_current_object()
+                self._thread = threading.Thread(target=self._run, args=(app,), name="scheduler", daemon=True)
+                self._thread.start()
+
+    def _lead(self, app):
+        try:
+            return self.leader.acquire()
+        except Exception:
+            app.logger.exception("Scheduler lease renewal failed")
+            return False
+
+    def _run(self, app):
+        while not self._stop.is_set():
+            if not self._lead(app):
+                self._stop.wait(1)
+                continue
+            for name, job in self.jobs.items():
+                now = time.monotonic()
+                if now < job["next_run"]:
+                    continue
+                # A long job may have outlived the lease; don't run alongside a new leader
+                if not self._lead(app):
+                    break
+                job["next_run"] = now + app.config[job["interval_key"]]
+                with app.app_context():
+                    try:
+                        job["func"]()
+                    except Exception:
+                        app.logger.exception("Scheduled job %s failed", name)
+            self._stop.wait(1)
+        self.leader.release()
+
+    def stop(self):
+        self._stop.set()
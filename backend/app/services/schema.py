@@ -0,0 +1,124 @@
+import time
+from flask import current_app
+from sqlalchemy import insert, inspect, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import AddConstraint, CreateColumn
+from ..extensions import db
+
+# Seconds before a schema object found missing is looked for again
+PROBE_RECHECK_SECONDS = 60
+_probes = {}
+
+
+def insert_ignore(model, values):
+    """Insert a `model` row in the caller's transaction unless it would
+    violate a unique key; returns its primary key, or None if it existed"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "sqlite":
+        stmt = sqlite_insert(model).values(values).on_conflict_do_nothing()
+    elif dialect == "mysql":
+        stmt = mysql_insert(model).values(values).prefix_with("IGNORE")
+    else:
+        try:
+            with db.session.begin_nested():
+                result = db.session.execute(insert(model).values(values))
+        except IntegrityError:
+            return None
+        return result.inserted_primary_key[0]
+    result = db.session.execute(stmt)
+    return result.inserted_primary_key[0] if result.rowcount == 1 else None
+
+
+def has_index(table, name):
+    """Whether index `name` exists on `table`, including the partial and
+    functional indexes that reflection can't describe"""
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        sql = "SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND tbl_name = :table AND name = :name"
+    elif dialect == "mysql":
+        sql = (
+            "SELECT COUNT(*) FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = :table AND index_name = :name"
+        )
+    else:
+        return any(i["name"] == name for i in inspect(db.engine).get_indexes(table))
+    return bool(db.session.execute(text(sql), {"table": table, "name": name}).scalar())
+
+
+def probe(key, check):
+    """`check()`, remembered per database: a hit for good, a miss for
+    PROBE_RECHECK_SECONDS so a running app notices the object once
+    `flask upgrade-schema` has created it"""
+    key = (str(db.engine.url), key)
+    now = time.monotonic()
+    cached = _probes.get(key)
+    if cached is not None and (cached[0] or cached[1] > now):
+        return cached[0]
+    found = bool(check())
+    _probes[key] = (found, now + PROBE_RECHECK_SECONDS)
+    return found
+
+
+def forget_probes():
+    _probes.clear()
+
+
+def _add_column(conn, table, column):
+    dialect = conn.dialect
+    ddl = str(CreateColumn(column).compile(dialect=dialect))
+    if dialect.name == "sqlite":
+        # SQLite can't add a constraint to an existing table, only an inline
+        # REFERENCES on the new column (which must then default to NULL)
+        for fk in column.foreign_keys:
+            ddl += f" REFERENCES {fk.column.table.name} ({fk.column.name})"
+    conn.execute(text(f"ALTER TABLE {dialect.identifier_preparer.format_table(table)} ADD COLUMN {ddl}"))
+    if dialect.name != "sqlite":
+        for fk in column.foreign_keys:
+            conn.execute(AddConstraint(fk.constraint))
+
+
+def upgrade_schema(batch_size=1000):
+    """Bring a database created by an earlier release up to the current models.
+
+    `db.create_all()` only creates missing tables, so columns and indexes
+    added to existing tables since are added here with ALTER TABLE / CREATE
+    INDEX. Duplicate reactions are removed so the reaction unique indexes
+    can be built. Denormalized counters, hot scores and comment paths are then
+    rebuilt from the raw rows. Every step checks what exists first, so the
+    command can be re-run at any time.
+    """
+    from .comment_tree import migrate_comment_paths
+    from .counters import reconcile_counters
+    from .ranking import redecay_hot_scores
+    from .reactions import ensure_reaction_indexes
+
+    result = {"tables": [], "columns": [], "indexes": []}
+    inspector = inspect(db.engine)
+    existing = set(inspector.get_table_names())
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing:
+                table.create(conn)
+                result["tables"].append(table.name)
+                continue
+            columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columns:
+                    _add_column(conn, table, column)
+                    result["columns"].append(f"{table.name}.{column.name}")
+            indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
+                    result["indexes"].append(index.name)
+
+    # Duplicates go before the counters are rebuilt from the reactions table
+    result["duplicate_reactions"] = ensure_reaction_indexes()
+    forget_probes()
+    result["counters"] = reconcile_counters(batch_size=batch_size)
+    result["hot_scores"] = redecay_hot_scores()
+    result["comment_paths"] = migrate_comment_paths(batch_size=batch_size)
+    current_app.logger.info("Schema upgrade: %s", result)
+    return result
@@ -0,0 +1,162 @@
+import re
+from markupsafe import escape
+from flask import current_app
+from sqlalchemy import DDL, bindparam, event, func, literal_column, text
+from sqlalchemy.dialects.mysql import match as mysql_match
+from ..extensions import db
+from ..models.post import Post
+from .schema import forget_probes, has_index, probe
+
+# SQLite: external-content FTS5 table over posts, kept in sync by triggers so
+# create/edit/delete stay consistent with the index inside one transaction.
+# Counter and soft-delete updates don't touch title/content_md and so skip
+# the update trigger entirely.
+SQLITE_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+        title, content_md, content='posts', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_ai AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_fts(rowid, title, content_md) VALUES (new.id, new.title, new.content_md);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_ad AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, content_md) VALUES ('delete', old.id, old.title, old.content_md);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_au AFTER UPDATE OF title, content_md ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, content_md) VALUES ('delete', old.id, old.title, old.content_md);
+        INSERT INTO posts_fts(rowid, title, content_md) VALUES (new.id, new.title, new.content_md);
+    END""",
+]
+
+# MySQL maintains FULLTEXT indexes itself on every write
+MYSQL_FULLTEXT_DDL = "ALTER TABLE posts ADD FULLTEXT INDEX ft_posts_search (title, content_md)"
+
+for statement in SQLITE_FTS_DDL:
+    event.listen(Post.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Post.__table__, "after_create", DDL(MYSQL_FULLTEXT_DDL).execute_if(dialect="mysql"))
+
+SNIPPET_TOKENS = 16
+_MARK_OPEN, _MARK_CLOSE = "\x02", "\x03"
+
+
+def _terms(search):
+    return re.findall(r"\w+", search, re.UNICODE)
+
+
+def _backend():
+    """'sqlite', 'mysql' or None when full-text search isn't available"""
+    if current_app.config.get("SEARCH_BACKEND", "auto") == "like":
+        return None
+    dialect = db.engine.dialect.name
+    if dialect not in ("sqlite", "mysql"):
+        return None
+    # Databases created before the index have none until `flask rebuild-search-index`
+    return dialect if probe("search_index", lambda: _index_exists(dialect)) else None
+
+
+def _index_exists(dialect):
+    if dialect == "sqlite":
+        return db.session.execute(
+            text("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'posts_fts'")
+        ).scalar()
+    return has_index("posts", "ft_posts_search")
+
+
+def search_hits(search):
+    """Subquery of (post_id, score) for posts matching `search`,
+    where a higher score is more relevant.
+
+    Returns None when no full-text backend applies and the caller should
+    fall back to ILIKE matching.
+    """
+    terms = _terms(search)
+    backend = _backend()
+    if not terms or backend is None:
+        return None
+
+    if backend == "sqlite":
+        return text(
+            "SELECT rowid AS post_id, -bm25(posts_fts, 10.0, 1.0) AS score "
+            "FROM posts_fts WHERE posts_fts MATCH :match"
+        ).bindparams(match=_fts5_query(terms)).columns(
+            literal_column("post_id"), literal_column("score")
+        ).subquery("hits")
+
+    relevance = _mysql_relevance(terms)
+    return db.session.query(Post.id.label("post_id"), relevance.label("score"))\
+        .filter(relevance > 0).subquery("hits")
+
+
+def _fts5_query(terms):
+    # Quote every term so user input can't inject FTS5 query syntax; the
+    # last term is a prefix match for search-as-you-type
+    return " ".join('"%s"' % t.replace('"', '""') for t in terms) + "*"
+
+
+def _mysql_relevance(terms):
+    against = " ".join("+%s*" % t for t in terms)
+    return mysql_match(Post.title, Post.content_md, against=against).in_boolean_mode()
+
+
+def search_snippets(search, post_ids):
+    """Highlighted, HTML-escaped snippets for one page of search results.
+
+    Kept out of search_hits so snippets are built for the returned page only,
+    not for every matching row before it is sorted and limited.
+    """
+    terms = _terms(search)
+    if not post_ids or not terms:
+        return {}
+    if _backend() == "sqlite":
+        rows = db.session.execute(text(
+            f"SELECT rowid, snippet(posts_fts, -1, '{_MARK_OPEN}', '{_MARK_CLOSE}', '…', {SNIPPET_TOKENS}) "
+            "FROM posts_fts WHERE posts_fts MATCH :match AND rowid IN :ids"
+        ).bindparams(bindparam("ids", expanding=True)), {"match": _fts5_query(terms), "ids": list(post_ids)})
+    else:
+        rows = db.session.query(Post.id, func.substring(Post.content_md, 1, 2000))\
+            .filter(Post.id.in_(post_ids))
+    return {post_id: _render(snippet, terms) for post_id, snippet in rows}
+
+
+def _render(snippet, terms):
+    # SQLite's snippet() has already delimited matches; for MySQL the raw
+    # leading text is trimmed around the first match here
+    if not snippet:
+        return None
+    if _MARK_OPEN not in snippet:
+        snippet = _highlight(snippet, terms)
+    html = str(escape(snippet))
+    return html.replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>")
+
+
+def _highlight(body, terms, width=160):
+    if not terms:
+        return body[:width]
+    pattern = re.compile(r"\b(%s)\w*" % "|".join(re.escape(t) for t in terms), re.IGNORECASE)
+    first = pattern.search(body)
+    start = max(first.start() - width // 4, 0) if first else 0
+    window = body[start:start + width]
+    marked = pattern.sub(lambda m: f"{_MARK_OPEN}{m.group(0)}{_MARK_CLOSE}", window)
+    return ("…" if start else "") + marked + ("…" if start + width < len(body) else "")
+
+
+def rebuild_search_index():
+    """Create the full-text index if missing and rebuild it from posts"""
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_FTS_DDL:
+            db.session.execute(text(statement))
+        db.session.execute(text("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')"))
+        db.session.execute(text("INSERT INTO posts_fts(posts_fts) VALUES ('optimize')"))
+    elif dialect == "mysql":
+        exists = db.session.execute(text(
+            "SELECT COUNT(*) FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = 'posts' AND index_name = 'ft_posts_search'"
+        )).scalar()
+        if not exists:
+            db.session.execute(text(MYSQL_FULLTEXT_DDL))
+        db.session.execute(text("OPTIMIZE TABLE posts"))
+    else:
+        return None
+    db.session.commit()
+    forget_probes()
+    return dialect
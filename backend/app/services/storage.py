@@ -0,0 +1,80 @@
+import os
+
+
+class FlatLayout:
+    """Every file directly in UPLOAD_FOLDER: <name>"""
+
+    def key(self, name):
+        return name
+
+
+class ShardedLayout:
+    """Two directory levels from the start of the name: ab/cd/<name>.
+
+    Upload names start with a hex hash or uuid, so files spread evenly over
+    65536 directories, and an image's derivatives (<sha256>-320w.webp) land
+    in the same directory as the image.
+    """
+
+    def __init__(self, levels=2, width=2):
+        self.levels = levels
+        self.width = width
+
+    def key(self, name):
+        shards = [name[i * self.width:(i + 1) * self.width] for i in range(self.levels)]
+        return "/".join(shards + [name])
+
+
+LAYOUTS = {"flat": FlatLayout, "sharded": ShardedLayout}
+
+
+class LocalStorage:
+    """Uploaded files under UPLOAD_FOLDER, placed by UPLOAD_LAYOUT.
+
+    A file's key is its path relative to the folder, with "/" separators;
+    it is what Blob.path stores and what follows /uploads/ in its URL.
+    """
+
+    URL_PREFIX = "/uploads/"
+
+    def __init__(self):
+        self.root = None
+        self.layout = None
+
+    def init_app(self, app):
+        self.root = app.config["UPLOAD_FOLDER"]
+        self.layout = LAYOUTS[app.config.get("UPLOAD_LAYOUT", "sharded")]()
+        app.extensions["storage"] = self
+
+    def key_for(self, name):
+        """Key a new file called `name` is stored under"""
+        return self.layout.key(name)
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def url(self, key):
+        return self.URL_PREFIX + key
+
+    def key_from_url(self, url):
+        return url[len(self.URL_PREFIX):] if url.startswith(self.URL_PREFIX) else url
+
+    def resolve(self, key):
+        """Key of the file a request for `key` should get. Bare names from
+        flat URLs (old rows, links pasted into posts) are looked up under
+        the current layout first, so they keep working after migration."""
+        if "/" in key:
+            return key
+        current = self.layout.key(key)
+        if current != key and os.path.exists(self.path(current)):
+            return current
+        return key
+
+    def move(self, key, new_key):
+        """Move a file to another key; False if there was nothing at `key`"""
+        source, target = self.path(key), self.path(new_key)
+        if not os.path.exists(source):
+            return False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(source, target)
+        return True
@@ -0,0 +1,75 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from ..extensions import db, feed_cache, storage
+from ..models.post import Blob, Media
+from .blobs import derivative_paths
+from .cache import post_tags
+
+
+def _move(key):
+    """Move a flat file and its derivatives to their keys under the current
+    layout; returns files moved. Files already moved are skipped, so an
+    interrupted batch can simply be run again."""
+    names = [key] + [os.path.basename(p) for p in derivative_paths(storage.path(key))]
+    return sum(storage.move(name, storage.key_for(name)) for name in names)
+
+
+def _rekey(url):
+    """URL of a flat-layout upload under the current layout"""
+    key = storage.key_from_url(url)
+    return storage.url(storage.key_for(key)) if "/" not in key else url
+
+
+def migrate_upload_layout(workers=8, batch_size=500):
+    """Move flat uploads into UPLOAD_LAYOUT and rewrite their rows.
+
+    Media rows still on flat URLs are taken a batch at a time: their files
+    (with derivatives) are moved by `workers` threads, then the rows' URLs
+    and their blobs' paths are rewritten in one transaction. Blobs no media
+    row points at follow the same way. Rows left behind by an interrupted
+    run are picked up by the next one, and moving a file twice is a no-op.
+    Returns {"media": rows rewritten, "blobs": ..., "files": files moved}.
+    """
+    result = {"media": 0, "blobs": 0, "files": 0}
+    if storage.key_for("x") == "x":
+        return result  # flat layout: nothing to move
+    flat_url = storage.url("%/%")
+
+    with ThreadPoolExecutor(workers) as pool:
+        last_id = 0
+        while True:
+            batch = Media.query.filter(Media.id > last_id, ~Media.url.like(flat_url))\
+                .order_by(Media.id).limit(batch_size).all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+            keys = {storage.key_from_url(m.url) for m in batch}
+            result["files"] += sum(pool.map(_move, keys))
+            for m in batch:
+                m.url = _rekey(m.url)
+                if m.derivatives:
+                    m.derivatives = [{**d, "url": _rekey(d["url"])} for d in m.derivatives]
+            shas = {m.blob_sha256 for m in batch if m.blob_sha256}
+            for blob in Blob.query.filter(Blob.sha256.in_(shas), ~Blob.path.contains("/")) if shas else ():
+                blob.path = storage.key_for(blob.path)
+                result["blobs"] += 1
+            db.session.commit()
+            result["media"] += len(batch)
+            tags = []
+            for post_id in {m.post_id for m in batch}:
+                tags.extend(post_tags(post_id))
+            feed_cache.invalidate(*tags)
+
+        while True:
+            blobs = Blob.query.filter(~Blob.path.contains("/")).limit(batch_size).all()
+            if not blobs:
+                break
+            result["files"] += sum(pool.map(_move, [b.path for b in blobs]))
+            for blob in blobs:
+                blob.path = storage.key_for(blob.path)
+            db.session.commit()
+            result["blobs"] += len(blobs)
+
+    current_app.logger.info("Upload layout migration: %s", result)
+    return result
@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy.orm import make_transient_to_detached
+
+
+class UserCache:
+    """Bounded TTL cache of user rows behind the Flask-Login user loader.
+
+    A hit rebuilds the User from its cached columns and attaches it to the
+    session with `merge(load=False)`, so authenticated requests skip the
+    users query while `current_user` stays a normal, updatable instance.
+
+    Entries are dropped through the UserVersions hook once a transaction
+    updating or deleting the user commits, and remember the user's version
+    they were read under, so a change made by one worker is seen by all of
+    them at once.
+    """
+
+    def __init__(self):
+        self.ttl = 0
+        self.max_entries = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        from ..extensions import user_versions
+
+        self.ttl = app.config.get("USER_CACHE_TTL", 300)
+        self.max_entries = app.config.get("USER_CACHE_MAX_ENTRIES", 10000)
+        app.extensions["user_cache"] = self
+        user_versions.subscribe(self.invalidate)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def _version(self, user_id):
+        from ..extensions import user_versions
+
+        return user_versions.get([user_id]).get(user_id, 0)
+
+    def load(self, user_id):
+        """The User with `user_id` attached to the current session, or None"""
+        from ..extensions import db
+        from ..models.user import User
+
+        if not self.ttl:
+            return db.session.get(User, user_id)
+        with self._lock:
+            item = self._entries.get(user_id)
+        if item is not None:
+            expires_at, version, columns = item
+            if expires_at > time.time() and version == self._version(user_id):
+                with self._lock:
+                    if user_id in self._entries:
+                        self._entries.move_to_end(user_id)
+                self.hits += 1
+                user = User(**columns)
+                make_transient_to_detached(user)
+                return db.session.merge(user, load=False)
+
+        self.misses += 1
+        # Read the version first: a change landing after it makes this entry stale
+        version = self._version(user_id)
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        columns = {attr.key: getattr(user, attr.key) for attr in User.__mapper__.column_attrs}
+        with self._lock:
+            self._entries[user_id] = (time.time() + self.ttl, version, columns)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return user
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "entries": len(self._entries),
+        }
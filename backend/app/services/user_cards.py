@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class UserCards:
+    """Author "cards" ({id, name, profile_pic, verified}) for list endpoints.
+
+    `get_many()` answers from a bounded LRU and loads every miss with one
+    `IN` query, so resolving the authors of a page is a single step. Entries
+    are dropped and versioned through UserVersions exactly like UserCache's.
+    """
+
+    def __init__(self):
+        self.ttl = 0
+        self.max_entries = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        from ..extensions import user_versions
+
+        self.ttl = app.config.get("USER_CARD_TTL", 600)
+        self.max_entries = app.config.get("USER_CARD_MAX_ENTRIES", 20000)
+        app.extensions["user_cards"] = self
+        user_versions.subscribe(self.invalidate)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def get_many(self, user_ids):
+        """{user_id: card} for every id; unknown users get a placeholder card"""
+        from ..extensions import db, user_versions
+        from ..models.user import User
+
+        ids = {uid for uid in user_ids if uid is not None}
+        if not ids:
+            return {}
+        versions = user_versions.get(ids)
+        now = time.time()
+        cards, missing = {}, []
+        with self._lock:
+            for uid in ids:
+                item = self._entries.get(uid)
+                if item and item[0] > now and item[1] == versions.get(uid, 0):
+                    self._entries.move_to_end(uid)
+                    cards[uid] = item[2]
+                else:
+                    missing.append(uid)
+        self.hits += len(cards)
+        self.misses += len(missing)
+
+        if missing:
+            rows = db.session.query(User.id, User.name, User.profile_pic, User.verified)\
+                .filter(User.id.in_(missing)).all()
+            with self._lock:
+                for row in rows:
+                    card = {"id": row.id, "name": row.name, "profile_pic": row.profile_pic, "verified": bool(row.verified)}
+                    cards[row.id] = card
+                    if self.ttl:
+                        self._entries[row.id] = (now + self.ttl, versions.get(row.id, 0), card)
+                        self._entries.move_to_end(row.id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            for uid in missing:
+                cards.setdefault(uid, {"id": uid, "name": "Unknown", "profile_pic": None, "verified": False})
+        return cards
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "entries": len(self._entries),
+        }
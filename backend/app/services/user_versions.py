@@ -0,0 +1,82 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from .local_sqlite import LocalSQLite
+
+
+class UserVersions:
+    """Change counter per user, kept in a local SQLite file
+    (USER_VERSIONS_PATH) that every worker on the host shares.
+
+    This is the one invalidation hook for the per-worker user caches: once
+    a transaction with an ORM update or delete of a user commits, the
+    user's version is bumped and every callback registered with
+    `subscribe()` (UserCache, UserCards) drops its entry. Those caches also
+    remember the version each entry was read under and drop it once that
+    moves, so a change committed in one worker is seen by all of them at
+    once, whatever FEED_CACHE_BACKEND is.
+    """
+
+    def __init__(self):
+        self._sqlite = None
+        self._callbacks = []
+        self._listening = False
+
+    def init_app(self, app):
+        from ..models.user import User
+
+        self._sqlite = LocalSQLite(app.config["USER_VERSIONS_PATH"], schema=[
+            "CREATE TABLE IF NOT EXISTS user_versions (user_id INTEGER PRIMARY KEY, version INTEGER NOT NULL)",
+        ])
+        app.extensions["user_versions"] = self
+        if not self._listening:
+            event.listen(User, "after_update", self._on_change)
+            event.listen(User, "after_delete", self._on_change)
+            event.listen(Session, "after_commit", self._on_commit)
+            event.listen(Session, "after_rollback", self._on_rollback)
+            self._listening = True
+
+    def subscribe(self, callback):
+        """Call `callback(user_id)` whenever a user change commits"""
+        if callback not in self._callbacks:
+            self._callbacks.append(callback)
+
+    def _on_change(self, mapper, connection, target):
+        # Held until commit: invalidating at flush would let a concurrent
+        # request re-cache the old row under the new version
+        session = object_session(target)
+        if session is None:
+            self.invalidate(target.id)
+        else:
+            session.info.setdefault("users_changed", set()).add(target.id)
+
+    def _on_commit(self, session):
+        # Savepoint commits and rollbacks fire these too; only the outermost counts
+        if session.get_nested_transaction() is None:
+            for user_id in session.info.pop("users_changed", ()):
+                self.invalidate(user_id)
+
+    def _on_rollback(self, session):
+        if session.get_nested_transaction() is None:
+            session.info.pop("users_changed", None)
+
+    def invalidate(self, user_id):
+        self.bump(user_id)
+        for callback in self._callbacks:
+            callback(user_id)
+
+    def get(self, user_ids):
+        """{user_id: version} for users that ever changed; others are at 0"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        placeholders = ",".join("?" * len(user_ids))
+        return dict(self._sqlite.conn().execute(
+            f"SELECT user_id, version FROM user_versions WHERE user_id IN ({placeholders})", user_ids,
+        ))
+
+    def bump(self, user_id):
+        self._sqlite.conn().execute(
+            "INSERT INTO user_versions (user_id, version) VALUES (?, 1) "
+            "ON CONFLICT (user_id) DO UPDATE SET version = version + 1",
+            (user_id,),
+        )
@@ -0,0 +1,114 @@
+"""Compare GET /posts?search= latency: full-text index vs the ILIKE scan.
+
+Builds a throwaway SQLite database with synthetic posts and times the same
+queries through both search paths.
+
+    python benchmarks/search_benchmark.py --posts 100000 --runs 20
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TOPIC_WORDS = (
+    "exam schedule hostel mess placement internship robotics club fest workshop "
+    "library lab seminar hackathon football cricket music dance drama coding "
+    "lecture assignment project deadline notice event canteen wifi bus "
+    "semester result scholarship alumni talk startup research paper campus"
+).split()
+QUERIES = ["robotics", "placement internship", "hackathon", "lib", "scholarship result", "canteen wifi"]
+SYLLABLES = "ka ri to na mu se lo pa vi de ru mi sho ta ne ga bo li ya chi".split()
+
+
+def make_vocabulary(rng, size=20_000):
+    """Synthetic long-tail vocabulary so topic words are reasonably selective"""
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+def seed(db, n_posts):
+    from sqlalchemy import text
+    from app.models.user import User
+
+    user = User(email="bench@nitrkl.ac.in", name="bench", verified=True)
+    user.set_password("bench")
+    db.session.add(user)
+    db.session.commit()
+
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(rng)
+    # Zipf-like weights: a handful of very common filler words, a long tail
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(n_posts):
+        words = rng.choices(vocabulary, weights=weights, k=rng.randint(40, 200))
+        words += rng.sample(TOPIC_WORDS, k=2)
+        rng.shuffle(words)
+        rows.append({
+            "user_id": user.id,
+            "title": " ".join(words[:6]).capitalize(),
+            "content_md": " ".join(words),
+            "category": rng.choice(["Events", "General", "Clubs", "Academics"]),
+            "created_at": start + timedelta(minutes=i),
+        })
+    db.session.execute(text(
+        "INSERT INTO posts (user_id, title, content_md, category, created_at, is_deleted) "
+        "VALUES (:user_id, :title, :content_md, :category, :created_at, 0)"
+    ), rows)
+    db.session.commit()
+
+
+def time_queries(app, client, backend, runs):
+    app.config["SEARCH_BACKEND"] = backend
+    timings = []
+    for query in QUERIES:
+        client.get("/posts", query_string={"search": query})  # warm up
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            resp = client.get("/posts", query_string={"search": query, "include_total": 1})
+            timings.append(time.perf_counter() - t0)
+            assert resp.status_code == 200
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=10, help="timed runs per query")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="campusfeed-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+    from app import create_app
+    from app.extensions import db, limiter
+
+    app = create_app()
+    limiter.enabled = False
+    with app.app_context():
+        db.create_all()
+        t0 = time.perf_counter()
+        seed(db, args.posts)
+        print(f"Seeded {args.posts} posts in {time.perf_counter() - t0:.1f}s ({workdir})")
+
+    client = app.test_client()
+    print(f"{'backend':<10}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for backend in ("auto", "like"):
+        timings = sorted(time_queries(app, client, backend, args.runs))
+        p50 = timings[len(timings) // 2] * 1000
+        p95 = timings[int(len(timings) * 0.95) - 1] * 1000
+        label = "fts" if backend == "auto" else "ilike"
+        print(f"{label:<10}{p50:>10.1f}{p95:>10.1f}{statistics.mean(timings) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
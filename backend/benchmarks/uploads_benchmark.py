@@ -0,0 +1,102 @@
+"""Compare GET /uploads throughput: the old handler vs each UPLOADS_SERVE_MODE.
+
+Writes synthetic uploads to a throwaway folder and drives the WSGI app
+in-process, so the numbers are the Python worker's cost per request: full
+downloads, client revalidations and PDF range requests.
+
+    python benchmarks/uploads_benchmark.py --seconds 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FILES = {
+    "image": ("3f" * 32 + ".jpg", 200 * 1024),
+    "pdf": ("9c" * 32 + ".pdf", 2 * 1024 * 1024),
+}
+
+
+def add_old_handler(app):
+    """The handler create_app used to register, mounted at /old-uploads"""
+    from flask import send_from_directory
+
+    @app.get("/old-uploads/<path:filename>")
+    def old_uploaded_file(filename):
+        upload_folder = app.config["UPLOAD_FOLDER"]
+        full_path = os.path.join(upload_folder, filename)
+        app.logger.info(f"Serving file: {filename}")
+        app.logger.info(f"Upload folder: {upload_folder}")
+        app.logger.info(f"Full path: {full_path}")
+        app.logger.info(f"File exists: {os.path.exists(full_path)}")
+        return send_from_directory(upload_folder, filename)
+
+
+def throughput(client, url, seconds, headers=None):
+    """Requests per second, reading each response body to the end"""
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        resp = client.get(url, headers=headers)
+        resp.get_data()
+        assert resp.status_code in (200, 206, 304), resp.status_code
+        done += 1
+    return done / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=3, help="duration of each measurement")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="campusfeed-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["UPLOAD_FOLDER"] = os.path.join(workdir, "uploads")
+    os.environ["NOTIFY_QUEUE_PATH"] = os.path.join(workdir, "notify.db")
+    os.environ["SCHEDULER_ENABLED"] = "0"
+    os.environ["NOTIFY_WORKERS"] = "0"
+    os.makedirs(os.environ["UPLOAD_FOLDER"])
+    for name, size in FILES.values():
+        with open(os.path.join(os.environ["UPLOAD_FOLDER"], name), "wb") as f:
+            f.write(os.urandom(size))
+
+    from app import create_app
+
+    app = create_app()
+    app.logger.setLevel("INFO")  # the old handler's log lines are part of its cost
+    app.logger.handlers.clear()
+    app.logger.propagate = False
+    add_old_handler(app)
+    client = app.test_client()
+
+    cases = [
+        ("image", FILES["image"][0], None),
+        ("image 304", FILES["image"][0], "revalidate"),
+        ("pdf", FILES["pdf"][0], None),
+        ("pdf range", FILES["pdf"][0], {"Range": "bytes=0-65535"}),
+    ]
+    handlers = [("old", "/old-uploads", "flask"), ("flask", "/uploads", "flask"),
+                ("x-accel", "/uploads", "x-accel"), ("x-sendfile", "/uploads", "x-sendfile")]
+    print(f"{'request':<12}" + "".join(f"{label:>12}" for label, _, _ in handlers) + "   (req/s)")
+    for case, name, headers in cases:
+        row = f"{case:<12}"
+        for _, prefix, mode in handlers:
+            app.config["UPLOADS_SERVE_MODE"] = mode
+            url = f"{prefix}/{name}"
+            request_headers = headers
+            if headers == "revalidate":
+                # Whatever ETag this handler gave out; offloading modes leave it to the web server
+                etag = client.get(url).headers.get("ETag")
+                if etag is None:
+                    row += f"{'-':>12}"
+                    continue
+                request_headers = {"If-None-Match": etag}
+            row += f"{throughput(client, url, args.seconds, request_headers):>12.0f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
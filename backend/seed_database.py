@@ -14,6 +14,9 @@ from app.models.user import User
 from app.models.post import Post, Media
 from app.models.comment import Comment
 from app.models.reaction import Reaction
+from app.services.comment_tree import comment_path
+from app.services.counters import reconcile_counters
+from app.services.ranking import redecay_hot_scores
 
 # Sample images from Lorem Picsum (random placeholder images)
 SAMPLE_IMAGES = [
@@ -320,10 +323,7 @@ def create_comments(users, posts):
         db.session.flush()
         
         # Set path after getting ID
-        if parent_comment:
-            comment.path = f"{parent_comment.path}.{comment.id}"
-        else:
-            comment.path = str(comment.id)
+        comment.path = comment_path(parent_comment.path if parent_comment else None, comment.id)
         
         comments.append(comment)
     
@@ -376,6 +376,16 @@ def create_reactions(users, posts, comments):
     db.session.commit()
     print(f"  ✓ Created {reaction_count} reactions")
 
+def update_counters():
+    """Fill the denormalized counters and hot scores from the seeded rows"""
+    print("\n📝 Updating counters...")
+    
+    # Comments and reactions above were inserted directly, bypassing the
+    # services that keep these columns in step
+    result = reconcile_counters()
+    rescored = redecay_hot_scores()
+    print(f"  ✓ Counted {result['posts']} posts and {result['comments']} comments, rescored {rescored} posts")
+
 def main():
     """Main seeding function"""
     print("\n" + "="*60)
@@ -412,6 +422,7 @@ def main():
         posts = create_posts(users, upload_folder)
         comments = create_comments(users, posts)
         create_reactions(users, posts, comments)
+        update_counters()
         
         # Print summary
         print("\n" + "="*60)
@@ -0,0 +1,74 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.config import Config
+from app.extensions import db, user_cache, user_cards
+from app.models.user import User
+from app.routes import posts
+from app.services.schema import forget_probes
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """App on a throwaway SQLite database, with every background thread and
+    process off; tests that need one drive it directly"""
+    overrides = {
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+        "UPLOAD_FOLDER": str(tmp_path / "uploads"),
+        "NOTIFY_QUEUE_PATH": str(tmp_path / "notify_queue.db"),
+        "FEED_CACHE_PATH": str(tmp_path / "feed_cache.db"),
+        "REACTION_BUFFER_PATH": str(tmp_path / "reaction_buffer.db"),
+        "USER_VERSIONS_PATH": str(tmp_path / "user_versions.db"),
+        "FEED_CACHE_BACKEND": "none",
+        "SCHEDULER_ENABLED": False,
+        "NOTIFY_WORKERS": 0,
+        "MEDIA_WORKERS": 0,
+        "RATELIMIT_ENABLED": False,
+    }
+    for key, value in overrides.items():
+        monkeypatch.setattr(Config, key, value, raising=False)
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
+    forget_probes()
+    # The caches are module-level singletons shared by every app instance
+    user_cache._entries.clear()
+    user_cards._entries.clear()
+    posts._total_cache.clear()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    def make_user(name):
+        with app.app_context():
+            user = User(email=f"{name}@nitrkl.ac.in", name=name, verified=True)
+            user.set_password("password")
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make_user
+
+
+@pytest.fixture
+def login(app):
+    def login(name):
+        client = app.test_client()
+        response = client.post("/auth/login", json={"email": f"{name}@nitrkl.ac.in", "password": "password"})
+        assert response.status_code == 200, response.json
+        return client
+    return login
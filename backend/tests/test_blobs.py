@@ -0,0 +1,77 @@
+import io
+import os
+
+from PIL import Image
+
+from app.extensions import storage
+from app.models.post import Blob, Media
+
+
+def _png(color="red"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _upload(client, post_id, data, name="photo.png"):
+    return client.post(
+        "/media/upload",
+        data={"post_id": str(post_id), "file": (io.BytesIO(data), name, "image/png")},
+        content_type="multipart/form-data",
+    )
+
+
+def _blob(app, sha=None):
+    with app.app_context():
+        blob = Blob.query.filter_by(sha256=sha).first() if sha else Blob.query.one()
+        return (blob.sha256, blob.ref_count, storage.path(blob.path)) if blob else None
+
+
+def test_identical_uploads_share_one_blob(app, make_user, login):
+    make_user("author")
+    client = login("author")
+    posts = [client.post("/posts", json={"title": f"Post {i}", "content_md": "x"}).json["id"] for i in range(2)]
+
+    first = _upload(client, posts[0], _png(), "a.png")
+    second = _upload(client, posts[1], _png(), "b.png")
+
+    assert first.status_code == second.status_code == 201
+    assert first.json["url"] == second.json["url"]
+    sha, ref_count, path = _blob(app)
+    assert ref_count == 2
+    assert os.path.exists(path)
+    # No spool files are left behind next to the blobs
+    leftovers = [name for _, _, names in os.walk(storage.root) for name in names if name.startswith(".upload-")]
+    assert leftovers == []
+
+
+def test_blob_file_is_deleted_with_its_last_reference(app, make_user, login):
+    make_user("author")
+    client = login("author")
+    posts = [client.post("/posts", json={"title": f"Post {i}", "content_md": "x"}).json["id"] for i in range(2)]
+    for post_id in posts:
+        _upload(client, post_id, _png())
+    sha, _, path = _blob(app)
+
+    client.delete(f"/posts/{posts[0]}")
+    assert _blob(app, sha)[1] == 1
+    assert os.path.exists(path)
+
+    client.delete(f"/posts/{posts[1]}")
+    assert _blob(app, sha) is None
+    assert not os.path.exists(path)
+    with app.app_context():
+        assert Media.query.count() == 0
+
+
+def test_different_bytes_get_different_blobs(app, make_user, login):
+    make_user("author")
+    client = login("author")
+    post_id = client.post("/posts", json={"title": "Post", "content_md": "x"}).json["id"]
+
+    _upload(client, post_id, _png("red"))
+    _upload(client, post_id, _png("blue"))
+
+    with app.app_context():
+        assert sorted(b.ref_count for b in Blob.query) == [1, 1]
+        assert len({m.url for m in Media.query}) == 2
@@ -0,0 +1,36 @@
+from app.services.comment_tree import PATH_SEGMENT_WIDTH, comment_path, encode_segment
+
+
+def test_path_segments_sort_numerically():
+    ids = [1, 9, 10, 35, 36, 1295, 1296, 999999]
+    segments = [encode_segment(i) for i in ids]
+
+    assert all(len(s) == PATH_SEGMENT_WIDTH for s in segments)
+    assert sorted(segments) == segments
+
+
+def test_replies_sort_after_their_parent_and_before_its_next_sibling():
+    first, reply, second = comment_path(None, 9), comment_path(comment_path(None, 9), 500), comment_path(None, 10)
+
+    assert sorted([second, reply, first]) == [first, reply, second]
+
+
+def test_thread_is_returned_in_creation_order_per_level(app, make_user, login):
+    make_user("author")
+    client = login("author")
+    post_id = client.post("/posts", json={"title": "Post", "content_md": "x"}).json["id"]
+
+    def comment(content, parent_id=None):
+        return client.post(f"/comments/post/{post_id}", json={"content": content, "parent_id": parent_id}).json["id"]
+
+    roots = [comment(f"root {i}") for i in range(12)]
+    replies = [comment(f"reply {i}", roots[0]) for i in range(11)]
+    nested = comment("nested", replies[9])
+
+    body = client.get(f"/comments/post/{post_id}?limit=50").json
+    by_id = {c["id"]: c for c in body["comments"]}
+
+    assert sorted(by_id) == sorted(roots)
+    first = by_id[roots[0]]
+    assert [r["id"] for r in first["replies"]] == replies
+    assert [r["id"] for r in first["replies"][9]["replies"]] == [nested]
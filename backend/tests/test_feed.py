@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app.extensions import db, feed_cache, user_cards
+from app.models.post import Media, Post
+
+
+def _seed_posts(app, make_user, count=60):
+    authors = [make_user(f"author{i}") for i in range(10)]
+    start = datetime(2026, 1, 1)
+    with app.app_context():
+        for i in range(count):
+            post = Post(
+                user_id=authors[i % len(authors)], title=f"Post {i}", content_md="body", category="General",
+                created_at=start + timedelta(minutes=i), reaction_count=i % 7,
+            )
+            db.session.add(post)
+            db.session.flush()
+            if i % 2:
+                db.session.add(Media(post_id=post.id, type="image", url=f"/uploads/{i}.png", mime="image/png"))
+        db.session.commit()
+
+
+def _count_statements(app, client, url):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    user_cards._entries.clear()
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert response.status_code == 200
+    return response, statements
+
+
+def test_feed_query_count_does_not_grow_with_page_size(app, client, make_user):
+    _seed_posts(app, make_user)
+    # Page mode's total is cached between requests; warm it so both pages
+    # are measured the same way
+    client.get("/posts?limit=1")
+
+    small, small_statements = _count_statements(app, client, "/posts?limit=5")
+    large, large_statements = _count_statements(app, client, "/posts?limit=50")
+
+    assert len(small.json["posts"]) == 5
+    assert len(large.json["posts"]) == 50
+    assert len(small_statements) == len(large_statements)
+
+
+def test_page_total_follows_new_and_deleted_posts(app, client, make_user, login):
+    _seed_posts(app, make_user, count=5)
+    app.config["FEED_CACHE_BACKEND"] = "sqlite"
+    feed_cache.init_app(app)
+    author = login("author0")
+    assert client.get("/posts?limit=2").json["total"] == 5
+
+    post_id = author.post("/posts", json={"title": "New", "content_md": "x"}).json["id"]
+    assert client.get("/posts?limit=2").json["total"] == 6
+
+    author.delete(f"/posts/{post_id}")
+    assert client.get("/posts?limit=2").json["total"] == 5
+
+
+def test_feed_batches_authors_and_covers(app, client, make_user):
+    _seed_posts(app, make_user)
+
+    posts = client.get("/posts?limit=10").json["posts"]
+
+    for post in posts:
+        assert post["author"]["name"] == post["user_name"]
+        assert (post["cover_url"] is not None) == (int(post["title"].split()[1]) % 2 == 1)
+
+
+def _walk(client, url):
+    ids, cursor = [], None
+    while True:
+        body = client.get(url + (f"&cursor={cursor}" if cursor else "")).json
+        ids.extend(p["id"] for p in body["posts"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def test_cursor_pagination_visits_every_post_once_in_order(app, client, make_user):
+    _seed_posts(app, make_user, count=23)
+    with app.app_context():
+        newest = [p.id for p in Post.query.order_by(Post.created_at.desc(), Post.id.desc())]
+        popular = [p.id for p in Post.query.order_by(Post.reaction_count.desc(), Post.created_at.desc(), Post.id.desc())]
+
+    assert _walk(client, "/posts?limit=5") == newest
+    assert _walk(client, "/posts?limit=4&sort=popular") == popular
+
+
+def test_invalid_cursor_is_rejected(client):
+    response = client.get("/posts?cursor=not-a-cursor")
+    assert response.status_code == 400
+    assert response.json["error"] == "Invalid cursor"
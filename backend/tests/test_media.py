@@ -0,0 +1,62 @@
+import io
+
+from PIL import Image
+
+from app.extensions import media_processor, scheduler
+from app.models.post import Media
+from app.services.images import process_image
+from app.services.media_processor import record_processed
+
+
+def _png():
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_images_uploaded_outside_the_leader_are_left_for_its_sweep(app, make_user, login, monkeypatch):
+    make_user("author")
+    client = login("author")
+    post_id = client.post("/posts", json={"title": "Post", "content_md": "x"}).json["id"]
+    monkeypatch.setattr(media_processor, "workers", 2)
+    submitted = []
+    monkeypatch.setattr(media_processor, "_submit", lambda url: submitted.append(url) or True)
+
+    url = client.post(
+        "/media/upload",
+        data={"post_id": str(post_id), "file": (io.BytesIO(_png()), "a.png", "image/png")},
+        content_type="multipart/form-data",
+    ).json["url"]
+    assert not scheduler.is_leader()
+    assert submitted == []
+
+    with app.app_context():
+        assert media_processor.sweep() == 1
+    assert submitted == [url]
+
+
+def test_sweep_does_not_retry_an_unreadable_image(app, make_user, login, monkeypatch):
+    make_user("author")
+    client = login("author")
+    post_id = client.post("/posts", json={"title": "Post", "content_md": "x"}).json["id"]
+    monkeypatch.setattr(media_processor, "workers", 2)
+    submitted = []
+
+    def process_now(url):
+        submitted.append(url)
+        record_processed(url, process_image(*media_processor._job(url)))
+        return True
+
+    monkeypatch.setattr(media_processor, "_submit", process_now)
+    url = client.post(
+        "/media/upload",
+        data={"post_id": str(post_id), "file": (io.BytesIO(b"not a png"), "broken.png", "image/png")},
+        content_type="multipart/form-data",
+    ).json["url"]
+
+    with app.app_context():
+        assert media_processor.sweep() == 1
+        media = Media.query.one()
+        assert media.derivatives == [] and media.width is None
+        assert media_processor.sweep() == 0
+    assert submitted == [url]
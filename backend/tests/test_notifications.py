@@ -0,0 +1,175 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db, notification_broker, notification_queue
+from app.models.notification import Notification, UnreadCounter
+from app.models.post import Post
+from app.services import notifications
+from app.services.notifications import deliver, notification_event
+
+
+def _drain(app):
+    with app.app_context():
+        return notification_queue.drain()
+
+
+def test_replies_are_delivered_through_the_queue(app, make_user, login):
+    make_user("author")
+    make_user("reader")
+    author = login("author")
+    post_id = author.post("/posts", json={"title": "Post", "content_md": "x"}).json["id"]
+
+    login("reader").post(f"/comments/post/{post_id}", json={"content": "hi"})
+
+    with app.app_context():
+        assert Notification.query.count() == 0
+    assert _drain(app) == 1
+    assert notification_queue.stats()["depth"] == 0
+    inbox = author.get("/notifications").json["notifications"]
+    assert [n["actor_name"] for n in inbox] == ["reader"]
+    assert author.get("/notifications/unread-count").json["count"] == 1
+
+
+def test_reactions_on_one_target_coalesce_into_one_notification(app, make_user, login):
+    make_user("author")
+    author = login("author")
+    post_id = author.post("/posts", json={"title": "Post", "content_md": "x"}).json["id"]
+    for name in ("r1", "r2", "r3"):
+        make_user(name)
+        login(name).post("/reactions", json={"post_id": post_id, "type": "like"})
+
+    _drain(app)
+
+    inbox = author.get("/notifications").json["notifications"]
+    assert len(inbox) == 1
+    assert inbox[0]["actor_count"] == 3
+    assert inbox[0]["content"] == "r3 and 2 others reacted to your post"
+    assert [a["name"] for a in inbox[0]["recent_actors"]] == ["r3", "r2", "r1"]
+
+
+def test_mark_read_moves_the_unread_counter(app, make_user, login):
+    make_user("author")
+    make_user("reader")
+    author = login("author")
+    reader = login("reader")
+    post_id = author.post("/posts", json={"title": "Post", "content_md": "x"}).json["id"]
+    for i in range(3):
+        reader.post(f"/comments/post/{post_id}", json={"content": f"c{i}"})
+    _drain(app)
+    assert author.get("/notifications/unread-count").json["count"] == 3
+
+    with app.app_context():
+        first = db.session.query(Notification.id).order_by(Notification.id).first()[0]
+    author.post(f"/notifications/{first}/read")
+    assert author.get("/notifications/unread-count").json["count"] == 2
+
+    author.post("/notifications/read-all")
+    assert author.get("/notifications/unread-count").json["count"] == 0
+
+
+def test_reading_pushes_the_lower_count_to_open_streams(app, make_user, login, monkeypatch):
+    author_id = make_user("author")
+    make_user("reader")
+    author = login("author")
+    reader = login("reader")
+    post_id = author.post("/posts", json={"title": "Post", "content_md": "x"}).json["id"]
+    for i in range(3):
+        reader.post(f"/comments/post/{post_id}", json={"content": f"c{i}"})
+    _drain(app)
+    # Opening a stream reads (and so creates) the unread counter first
+    assert author.get("/notifications/unread-count").json["count"] == 3
+    monkeypatch.setattr(notification_broker, "_start_once", lambda: None)
+    stream = notification_broker.subscribe(author_id)
+    try:
+        with app.app_context():
+            notification_broker.poll([author_id])
+        assert [e[0] for e in stream.queue] == ["notification"] * 3 + ["unread"]
+        stream.queue.clear()
+
+        with app.app_context():
+            first = db.session.query(Notification.id).order_by(Notification.id).first()[0]
+        author.post(f"/notifications/{first}/read")
+        assert list(stream.queue) == [("unread", None, {"count": 2})]
+
+        # A read handled by another process is picked up by the next poll
+        stream.queue.clear()
+        with app.app_context():
+            db.session.query(UnreadCounter).filter_by(user_id=author_id).update({"unread": 1})
+            db.session.commit()
+            notification_broker.poll([author_id])
+            assert list(stream.queue) == [("unread", None, {"count": 1})]
+            stream.queue.clear()
+            notification_broker.poll([author_id])
+        assert list(stream.queue) == []
+
+        author.post("/notifications/read-all")
+        assert list(stream.queue) == [("unread", None, {"count": 0})]
+    finally:
+        notification_broker.unsubscribe(author_id, stream)
+
+
+def test_repeat_actor_outside_the_recent_list_is_counted_once(app, make_user, login):
+    make_user("author")
+    author = login("author")
+    post_id = author.post("/posts", json={"title": "Post", "content_md": "x"}).json["id"]
+    for name in ("r1", "r2", "r3", "r4"):
+        make_user(name)
+        login(name).post("/reactions", json={"post_id": post_id, "type": "like"})
+    _drain(app)
+
+    # r1 has dropped out of the three recent actors by now
+    login("r1").post("/reactions", json={"post_id": post_id, "type": "helpful"})
+    _drain(app)
+
+    [notification] = author.get("/notifications").json["notifications"]
+    assert notification["actor_count"] == 4
+    assert notification["content"] == "r1 and 3 others reacted to your post"
+    assert [a["name"] for a in notification["recent_actors"]] == ["r1", "r4", "r3"]
+
+
+def test_concurrently_opened_aggregates_merge_into_one_row(app, make_user, monkeypatch):
+    author_id = make_user("author")
+    r1, r2 = make_user("r1"), make_user("r2")
+    with app.app_context():
+        post = Post(user_id=author_id, title="Post", content_md="x")
+        db.session.add(post)
+        db.session.commit()
+        events = [
+            notification_event(author_id, actor_id, name, "post_reaction", f"{name} reacted to your post", post_id=post.id)
+            for actor_id, name in ((r1, "r1"), (r2, "r2"))
+        ]
+        deliver([events[0]])
+
+        # A second worker read before the first one committed its aggregate
+        monkeypatch.setattr(notifications, "_open_aggregates", lambda keys, cutoff: {})
+        with pytest.raises(IntegrityError):
+            deliver([events[1]])
+        monkeypatch.undo()
+        deliver([events[1]])  # the queue's retry
+
+        [notification] = Notification.query.all()
+        assert notification.actor_count == 2
+        assert notification.content == "r2 and 1 other reacted to your post"
+
+
+def test_a_closed_aggregate_hands_its_key_to_a_new_row(app, make_user):
+    author_id = make_user("author")
+    reader_id = make_user("reader")
+    with app.app_context():
+        post = Post(user_id=author_id, title="Post", content_md="x")
+        db.session.add(post)
+        db.session.commit()
+        event = notification_event(author_id, reader_id, "reader", "post_reaction", "reader reacted", post_id=post.id)
+        deliver([event])
+        hours = app.config["NOTIFY_COALESCE_WINDOW_HOURS"] + 1
+        old = Notification.query.one()
+        old.created_at -= timedelta(hours=hours)
+        db.session.commit()
+
+        deliver([event])
+
+        rows = Notification.query.order_by(Notification.id).all()
+        assert [n.coalesce_key is None for n in rows] == [True, False]
+        assert [n.actor_count for n in rows] == [1, 1]
@@ -0,0 +1,151 @@
+from sqlalchemy import text, update
+
+from app.extensions import db, feed_cache
+from app.models.comment import Comment
+from app.models.post import Post
+from app.models.reaction import Reaction
+from app.services.cache import MemoryBackend
+from app.services.counters import reconcile_counters
+from app.services.reactions import ensure_reaction_indexes, reaction_indexes_ready
+from app.services.schema import forget_probes
+
+
+def _post(app, client, title="Post"):
+    return client.post("/posts", json={"title": title, "content_md": "body"}).json["id"]
+
+
+def _counts(app, model, target_id):
+    with app.app_context():
+        row = db.session.get(model, target_id)
+        return row.reaction_count, row.like_count, Reaction.query.count()
+
+
+def test_repeat_reaction_is_stored_and_counted_once(app, make_user, login):
+    make_user("author")
+    make_user("reader")
+    post_id = _post(app, login("author"))
+    reader = login("reader")
+
+    first = reader.post("/reactions", json={"post_id": post_id, "type": "like"})
+    second = reader.post("/reactions", json={"post_id": post_id, "type": "like"})
+
+    assert first.status_code == 201
+    assert second.status_code == 200
+    assert second.json["id"] == first.json["id"]
+    assert _counts(app, Post, post_id) == (1, 1, 1)
+
+
+def test_removing_a_reaction_decrements_counters(app, make_user, login):
+    make_user("author")
+    make_user("reader")
+    post_id = _post(app, login("author"))
+    reader = login("reader")
+    reader.post("/reactions", json={"post_id": post_id, "type": "like"})
+
+    assert reader.delete("/reactions", json={"post_id": post_id, "type": "like"}).status_code == 200
+    assert reader.delete("/reactions", json={"post_id": post_id, "type": "like"}).status_code == 404
+    assert _counts(app, Post, post_id) == (0, 0, 0)
+
+
+def test_comment_reactions_are_deduplicated_separately_from_post_reactions(app, make_user, login):
+    make_user("author")
+    make_user("reader")
+    author = login("author")
+    post_id = _post(app, author)
+    comment_id = author.post(f"/comments/post/{post_id}", json={"content": "hi"}).json["id"]
+    reader = login("reader")
+
+    reader.post("/reactions", json={"post_id": post_id, "type": "like"})
+    reader.post("/reactions", json={"comment_id": comment_id, "type": "like"})
+    reader.post("/reactions", json={"comment_id": comment_id, "type": "like"})
+
+    assert _counts(app, Post, post_id) == (1, 1, 2)
+    assert _counts(app, Comment, comment_id)[:2] == (1, 1)
+
+
+def test_duplicates_are_refused_before_the_unique_indexes_exist(app, make_user, login):
+    make_user("author")
+    make_user("reader")
+    post_id = _post(app, login("author"))
+    with app.app_context():
+        db.session.execute(text("DROP INDEX uniq_post_reaction"))
+        db.session.commit()
+        forget_probes()
+        assert not reaction_indexes_ready()
+    reader = login("reader")
+
+    reader.post("/reactions", json={"post_id": post_id, "type": "like"})
+    second = reader.post("/reactions", json={"post_id": post_id, "type": "like"})
+
+    assert second.status_code == 200
+    assert _counts(app, Post, post_id) == (1, 1, 1)
+
+
+def test_ensure_reaction_indexes_removes_existing_duplicates(app, make_user):
+    author = make_user("author")
+    reader = make_user("reader")
+    with app.app_context():
+        db.session.execute(text("DROP INDEX uniq_post_reaction"))
+        post = Post(user_id=author, title="Post", content_md="body")
+        db.session.add(post)
+        db.session.flush()
+        for type_ in ("like", "like", "funny"):
+            db.session.add(Reaction(post_id=post.id, user_id=reader, type=type_))
+        db.session.commit()
+
+        assert ensure_reaction_indexes() == 1
+        assert ensure_reaction_indexes() == 0
+        assert sorted(r.type for r in Reaction.query) == ["funny", "like"]
+        forget_probes()
+        assert reaction_indexes_ready()
+
+
+def test_buffered_reaction_is_visible_to_other_workers_until_flushed(app, make_user, login, monkeypatch):
+    from app.services.reaction_buffer import ReactionBuffer
+
+    make_user("author")
+    reader_id = make_user("reader")
+    post_id = _post(app, login("author"))
+    app.config.update(REACTION_WRITE_BEHIND=True, REACTION_FLUSH_INTERVAL_MS=60000)
+    reaction_buffer = app.extensions["reaction_buffer"]
+    reaction_buffer.init_app(app)
+    # A second buffer on the same file stands in for another worker process
+    other = ReactionBuffer()
+    other.init_app(app)
+    monkeypatch.setattr(reaction_buffer, "_start_once", lambda: None)
+    reader = login("reader")
+
+    assert reader.post("/reactions", json={"post_id": post_id, "type": "like"}).status_code == 202
+    assert other.pending_for(reader_id, post_id=post_id) == {"like": True}
+    assert _counts(app, Post, post_id) == (0, 0, 0)
+
+    assert other.flush() == 1
+    assert _counts(app, Post, post_id) == (1, 1, 1)
+    assert reaction_buffer.pending_for(reader_id, post_id=post_id) == {}
+    assert reaction_buffer.flush() == 0
+
+
+def test_repaired_counters_change_the_etag_and_drop_cached_pages(app, client, make_user, login, monkeypatch):
+    monkeypatch.setattr(feed_cache, "backend", MemoryBackend(64))
+    make_user("author")
+    make_user("reader")
+    author = login("author")
+    liked_id = _post(app, author, "Liked")
+    drifted_id = _post(app, author, "Drifted")
+    reader = login("reader")
+    reader.post("/reactions", json={"post_id": drifted_id, "type": "like"})
+    reader.post("/reactions", json={"post_id": liked_id, "type": "like"})
+    reader.delete("/reactions", json={"post_id": drifted_id, "type": "like"})
+    with app.app_context():
+        db.session.execute(update(Post).where(Post.id == drifted_id).values(like_count=5, reaction_count=5))
+        db.session.commit()
+    etag = reader.get(f"/reactions/post/{drifted_id}").headers["ETag"]
+    assert [p["id"] for p in client.get("/posts?sort=popular").json["posts"]] == [drifted_id, liked_id]
+
+    with app.app_context():
+        assert reconcile_counters() == {"posts": 1, "comments": 0}
+
+    response = reader.get(f"/reactions/post/{drifted_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json["counts"] == {}
+    assert [p["id"] for p in client.get("/posts?sort=popular").json["posts"]] == [liked_id, drifted_id]
@@ -0,0 +1,24 @@
+from app.services.leader import LeaderLock
+
+
+def test_only_one_lock_holder_at_a_time(tmp_path):
+    path = str(tmp_path / "leader.db")
+    first, second = LeaderLock(path, "scheduler", 60), LeaderLock(path, "scheduler", 60)
+
+    assert first.acquire()
+    assert not second.acquire()
+    assert first.acquire()  # renewal
+
+    first.release()
+    assert second.acquire()
+    assert not first.held()
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    path = str(tmp_path / "leader.db")
+    stale, fresh = LeaderLock(path, "scheduler", 0), LeaderLock(path, "scheduler", 60)
+
+    stale.acquire()
+    assert fresh.acquire()
+    assert not stale.acquire()
+    assert fresh.held()
@@ -0,0 +1,112 @@
+import os
+import subprocess
+import sys
+
+from app.extensions import db, feed_cache, user_cache, user_cards, user_versions
+from app.models.user import User
+from app.services.cache import MemoryBackend
+
+# A second web worker: its own process, so its own module-level caches
+WORKER = """
+import sys
+from app import create_app
+from app.extensions import user_cache, user_cards
+
+app = create_app()
+user_id = int(sys.argv[1])
+for _ in range(2):
+    with app.app_context():
+        print(user_cache.load(user_id).name, user_cards.get_many([user_id])[user_id]["name"], flush=True)
+    sys.stdin.readline()
+"""
+
+
+def test_entry_is_dropped_when_the_update_commits_not_at_flush(app, make_user):
+    user_id = make_user("alice")
+    with app.app_context():
+        user_cache.load(user_id)
+        user = db.session.get(User, user_id)
+        user.name = "Alice"
+        db.session.flush()
+        assert user_id in user_cache._entries
+
+        db.session.commit()
+        assert user_id not in user_cache._entries
+    with app.app_context():
+        assert user_cache.load(user_id).name == "Alice"
+
+
+def test_rolled_back_update_keeps_the_entry(app, make_user):
+    user_id = make_user("alice")
+    with app.app_context():
+        user_cache.load(user_id)
+        db.session.get(User, user_id).name = "Alice"
+        db.session.flush()
+        db.session.rollback()
+        assert user_id in user_cache._entries
+        db.session.commit()
+        assert user_id in user_cache._entries
+        assert user_cache.load(user_id).name == "alice"
+
+
+def test_author_card_is_dropped_when_the_update_commits(app, make_user):
+    user_id = make_user("alice")
+    with app.app_context():
+        assert user_cards.get_many([user_id])[user_id]["name"] == "alice"
+        db.session.get(User, user_id).name = "Alice"
+        db.session.flush()
+        assert user_id in user_cards._entries
+
+        db.session.commit()
+        assert user_id not in user_cards._entries
+        assert user_cards.get_many([user_id])[user_id]["name"] == "Alice"
+
+
+def test_one_commit_drops_both_caches_and_bumps_the_version_once(app, make_user):
+    user_id = make_user("alice")
+    with app.app_context():
+        before = user_versions.get([user_id]).get(user_id, 0)
+        user_cache.load(user_id)
+        user_cards.get_many([user_id])
+        user = db.session.get(User, user_id)
+        with db.session.begin_nested():
+            user.name = "Alice"
+        user.verified = False
+        db.session.commit()
+        assert user_id not in user_cache._entries
+        assert user_id not in user_cards._entries
+        assert user_versions.get([user_id])[user_id] == before + 1
+
+
+def test_update_reaches_another_worker_with_the_memory_feed_cache(app, make_user, monkeypatch):
+    user_id = make_user("alice")
+    monkeypatch.setattr(feed_cache, "backend", MemoryBackend(64))
+    env = dict(
+        os.environ,
+        DATABASE_URL=app.config["SQLALCHEMY_DATABASE_URI"],
+        USER_VERSIONS_PATH=app.config["USER_VERSIONS_PATH"],
+        NOTIFY_QUEUE_PATH=app.config["NOTIFY_QUEUE_PATH"],
+        REACTION_BUFFER_PATH=app.config["REACTION_BUFFER_PATH"],
+        UPLOAD_FOLDER=app.config["UPLOAD_FOLDER"],
+        FEED_CACHE_BACKEND="memory",
+        SCHEDULER_ENABLED="0",
+        NOTIFY_WORKERS="0",
+        MEDIA_WORKERS="0",
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    worker = subprocess.Popen(
+        [sys.executable, "-c", WORKER, str(user_id)],
+        cwd=root, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        assert worker.stdout.readline().split() == ["alice", "alice"]
+        with app.app_context():
+            user_cache.load(user_id)
+            db.session.get(User, user_id).name = "Alice"
+            db.session.commit()
+        worker.stdin.write("\n")
+        worker.stdin.flush()
+        assert worker.stdout.readline().split() == ["Alice", "Alice"]
+    finally:
+        worker.stdin.close()
+        worker.wait(timeout=30)